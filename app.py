@@ -1,17 +1,82 @@
-from datetime import datetime as dt
-from flask import Flask, jsonify, render_template, request
-from cozymeal import articles as cza, emails as cze, utils as czu, settings
+import base64
+import binascii
+import hashlib
+import json
+import logging
+import time
+
+from datetime import datetime as dt, timezone
+from flask import Flask, Response, g, jsonify, render_template, request, url_for
+from cozymeal import feed as czfd, locks, metrics as czm, outbox as czo, search as czq, sources as czsrc, store as czs, utils as czu, settings
+from cozymeal.articles import Article
+
+logging.basicConfig(level=settings.LOG_LEVEL, format="%(message)s")
+settings.init()
 
 app = Flask(__name__)
+
+# Seconds clients are asked to wait while the first crawl is still running.
+NOT_CRAWLED_RETRY_AFTER = 5
+
+def _not_crawled_yet() -> tuple[Response, int, dict]:
+    return jsonify({"error": "Articles haven't been collected yet"}), 503, {"Retry-After": str(NOT_CRAWLED_RETRY_AFTER)}
+
+def _article_json(article: Article) -> dict:
+    return {
+        "title": article.get_pretty_title(),
+        "url": article.url,
+        "date_published": article.get_pretty_date(),
+    }
+
+def _is_not_modified(etag: str, last_modified: dt | None) -> bool:
+    # If-None-Match wins over If-Modified-Since when a client sends both.
+    if request.if_none_match:
+        return request.if_none_match.contains(etag)
+
+    return bool(last_modified and request.if_modified_since and last_modified <= request.if_modified_since)
+
+def _parse_date(value: str) -> dt:
+    date = dt.fromisoformat(value)
+    return date if date.tzinfo else settings.DEFAULT_TZ.localize(date)
+
+def _encode_cursor(article: Article) -> str:
+    key = [article.date_published.timestamp(), article.url]
+    return base64.urlsafe_b64encode(json.dumps(key).encode()).decode()
+
+def _decode_cursor(cursor: str) -> tuple[float, str]:
+    published_ts, url = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    return float(published_ts), str(url)
+
+@app.before_request
+def start_timer():
+    g.start_time = time.perf_counter()
+
+@app.before_request
+def start_outbox_sender():
+    # Also picks up anything left queued by a previous run.
+    czo.start_sender()
+
+@app.teardown_request
+def record_request_time(error: BaseException | None):
+    if request.endpoint and "start_time" in g:
+        czm.record(request.endpoint, time.perf_counter() - g.start_time, error is None, method=request.method)
  
 @app.get("/")
 def render_home_page():
     date_a_week_ago = czu.get_date_a_week_ago()
     last_checked_str = date_a_week_ago.strftime("%m/%d/%Y")
 
+    # The list is rendered straight from the store whenever it holds
+    # anything. Only a store that has never been filled leaves it to the
+    # page's script, which polls /articles until the first crawl is in.
+    article_list = None
+    if czs.get_refreshed_at() is not None:
+        article_list = czs.query_articles(since=date_a_week_ago, limit=settings.ARTICLES_PAGE_SIZE)
+
     return render_template(
         'home.html',
         last_checked = last_checked_str,
+        articles = article_list,
     )
 
 @app.post("/")
@@ -19,32 +84,129 @@ def email_for_new_articles():
     if not czu.verify_token(request):
         return jsonify({"error": "Unauthorized - Invalid or missing token"}), 401
 
-    last_checked = czu.get_last_checked()
-    if not last_checked:
-        last_checked = czu.get_date_a_week_ago()
+    # Crawling is left to the worker, so the digest covers whatever it last
+    # collected, and each source's cursor only moves up to when its own last
+    # successful crawl started. A source that keeps failing keeps its cursor.
+    if czs.get_refreshed_at() is None:
+        return _not_crawled_yet()
+
+    # Overlapping requests take turns, so the same articles are never queued
+    # twice; articles already sent are dropped as well.
+    with locks.file_lock(settings.DIGEST_LOCK_FILENAME):
+        sources = czsrc.load_sources()
+        cursors = {}
+        for source in sources:
+            cursors[source.name] = czu.get_last_checked(source.name) or czu.get_date_a_week_ago()
 
-    article_list = list(cza.get_new_articles(last_checked))
-    if not article_list:
-        return '', 204
+        article_list = czo.get_unsent_articles(czs.get_new_articles(cursors))
+        if not article_list:
+            return '', 204
 
-    cze.send_email_for_articles(article_list)
+        # The digest is sent in the background; once it's safely queued the
+        # cursors can move on.
+        czo.enqueue(article_list)
 
-    last_checked = dt.now(settings.DEFAULT_TZ)
-    czu.set_last_checked(last_checked)
+        source_refreshed_at = czs.get_source_refreshed_at()
+        by_refreshed_at = {}
+        for name in cursors:
+            if name in source_refreshed_at:
+                by_refreshed_at.setdefault(source_refreshed_at[name], []).append(name)
+        for refreshed_at, names in by_refreshed_at.items():
+            czu.set_last_checked(dt.fromtimestamp(refreshed_at, settings.DEFAULT_TZ), names)
 
-    return jsonify({"status": "success"}), 200
+    return jsonify({"status": "queued"}), 202
 
 @app.get("/articles")
 def get_new_articles_this_week():
-    date_a_week_ago = czu.get_date_a_week_ago()
-    article_list = cza.get_new_articles(date_a_week_ago)
+    # Without any parameters this is still the last week's articles.
+    try:
+        since = _parse_date(request.args["since"]) if "since" in request.args else czu.get_date_a_week_ago()
+        until = _parse_date(request.args["until"]) if "until" in request.args else None
+        limit = int(request.args.get("limit", settings.ARTICLES_PAGE_SIZE))
+        after = _decode_cursor(request.args["cursor"]) if "cursor" in request.args else None
+    except (ValueError, TypeError, OverflowError, binascii.Error):
+        return jsonify({"error": "Invalid since, until, limit or cursor"}), 400
+
+    if limit < 1:
+        return jsonify({"error": "limit must be positive"}), 400
+
+    if czs.get_refreshed_at() is None:
+        return _not_crawled_yet()
+
+    # A title search goes through the search index, so q matches words the
+    # same way /search does.
+    limit = min(limit, settings.ARTICLES_MAX_PAGE_SIZE)
+    filters = {"since": since, "until": until, "source": request.args.get("source"), "after": after}
+    query = request.args.get("q")
+    if query:
+        article_list = czq.search(query, limit + 1, **filters)
+    else:
+        article_list = czs.query_articles(limit=limit + 1, **filters)
+    next_cursor = _encode_cursor(article_list[limit - 1]) if len(article_list) > limit else None
+    article_list = article_list[:limit]
+
+    # The store version covers any change to the articles themselves; the
+    # URLs cover which articles this particular page holds.
+    etag = hashlib.sha1(json.dumps([czs.get_version(), [a.url for a in article_list], next_cursor]).encode()).hexdigest()
+    changed_at = czs.get_changed_at()
+    last_modified = dt.fromtimestamp(int(changed_at), timezone.utc) if changed_at else None
+
+    if _is_not_modified(etag, last_modified):
+        response = Response(status=304)
+    else:
+        response = jsonify([_article_json(a) for a in article_list])
+
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    response.cache_control.public = True
+    response.cache_control.max_age = settings.ARTICLES_MAX_AGE
+    if next_cursor:
+        next_url = url_for("get_new_articles_this_week", **{**request.args, "cursor": next_cursor})
+        response.headers["Link"] = f'<{next_url}>; rel="next"'
+
+    return response
+
+@app.get("/search")
+def search_articles():
+    # Matches words starting with each word of `q`, across every article
+    # ever collected, newest first.
+    query = request.args.get("q", "")
+    try:
+        limit = int(request.args.get("limit", settings.ARTICLES_PAGE_SIZE))
+    except ValueError:
+        return jsonify({"error": "Invalid limit"}), 400
+
+    if not czq.tokenize(query):
+        return jsonify({"error": "q must contain at least one word"}), 400
+
+    if limit < 1:
+        return jsonify({"error": "limit must be positive"}), 400
+
+    if czs.get_refreshed_at() is None:
+        return _not_crawled_yet()
+
+    article_list = czq.search(query, min(limit, settings.ARTICLES_MAX_PAGE_SIZE))
+    return jsonify([_article_json(article) for article in article_list])
+
+@app.get("/feed.xml")
+def get_feed():
+    # Polls are answered from the prebuilt feed, usually without touching
+    # the store at all.
+    feed = czfd.get_feed(request.url_root)
+    if feed is None:
+        return _not_crawled_yet()
+
+    if _is_not_modified(feed.etag, feed.last_modified):
+        response = Response(status=304)
+    else:
+        response = Response(feed.body, mimetype="application/atom+xml")
 
-    article_data = []
-    for article in article_list:
-        article_data.append({
-            "title": article.get_pretty_title(),
-            "url": article.url,
-            "date_published": article.get_pretty_date(),
-        })
+    response.set_etag(feed.etag)
+    response.last_modified = feed.last_modified
+    response.cache_control.public = True
+    response.cache_control.max_age = settings.FEED_MAX_AGE
+    return response
 
-    return jsonify(article_data)
\ No newline at end of file
+@app.get("/metrics")
+def get_metrics():
+    return Response(czm.render(), mimetype="text/plain; version=0.0.4")
@@ -0,0 +1,97 @@
+"""Measure the memory and serialization cost of Article objects.
+
+Run from the repository root:
+
+    python -m bench.articles [--articles N] [--repeat N]
+"""
+
+import argparse
+import json
+import os
+import time
+import tracemalloc
+
+for name in ("EMAIL_PASSWORD", "EMAIL_USERNAME", "RECEIVER_EMAIL"):
+    os.environ.setdefault(name, "bench@example.com")
+
+from cozymeal import articles as cza, settings
+from datetime import datetime as dt, timedelta as tdelta
+from html import unescape
+from typing import Callable
+
+class LegacyArticle:
+    # Article as it was before: a plain class whose display fields are
+    # recomputed on every access.
+    def __init__(self, title: str, url: str, date_published: dt, source: str | None = None):
+        self.title = title
+        self.url = url
+        self.date_published = date_published
+        self.source = source
+
+    def get_pretty_title(self):
+        return unescape(self.title)
+
+    def get_pretty_date(self):
+        return self.date_published.strftime("%m/%d/%Y")
+
+def make_articles(cls: type, count: int) -> list:
+    start = dt(2025, 1, 1, tzinfo=settings.DEFAULT_TZ)
+    return [
+        cls(f"Recipe &amp; Story {i}", f"https://www.cozymeal.com/magazine/article-{i}", start - tdelta(hours=i), "sarah-salisbury")
+        for i in range(count)
+    ]
+
+def bytes_per_article(cls: type, count: int) -> float:
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    kept = make_articles(cls, count)
+    after, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del kept
+
+    return (after - before) / count
+
+def serialize_display(article_list: list) -> str:
+    # What GET /articles does with each article; the display fields are read
+    # twice, as the page and the email both do.
+    data = []
+    for article in article_list:
+        article.get_pretty_title()
+        data.append({
+            "title": article.get_pretty_title(),
+            "url": article.url,
+            "date_published": article.get_pretty_date(),
+        })
+
+    return json.dumps(data)
+
+def measure(func: Callable, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--articles", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"{args.articles} articles, {args.repeat} runs")
+    for cls in (LegacyArticle, cza.Article):
+        print(f"{cls.__name__:>14}: {bytes_per_article(cls, args.articles):7.1f} bytes/article")
+
+    legacy, compact = make_articles(LegacyArticle, args.articles), make_articles(cza.Article, args.articles)
+    for name, article_list in (("LegacyArticle", legacy), ("Article", compact)):
+        elapsed = measure(lambda: serialize_display(article_list), args.repeat)
+        print(f"{name:>14}: {elapsed * 1000:7.2f} ms to serialize for /articles")
+
+    as_json = json.dumps([a.to_dict() for a in compact])
+    as_bytes = cza.pack_articles(compact)
+    print(f"{'JSON':>14}: {len(as_json) / args.articles:7.1f} bytes/article, "
+          f"{measure(lambda: [cza.Article.from_dict(a) for a in json.loads(as_json)], args.repeat) * 1000:7.2f} ms to load")
+    print(f"{'binary':>14}: {len(as_bytes) / args.articles:7.1f} bytes/article, "
+          f"{measure(lambda: cza.unpack_articles(as_bytes), args.repeat) * 1000:7.2f} ms to load")
+
+if __name__ == "__main__":
+    main()
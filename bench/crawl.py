@@ -0,0 +1,112 @@
+"""Benchmark crawling recorded archive pages served from a local stub server.
+
+Run from the repository root:
+
+    python -m bench.crawl [--pages 10 100 1000] [--latency SECONDS]
+
+Each archive size runs in its own process so that peak RSS is reported per
+size rather than for the whole run.
+"""
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+def run(pages: int, latency: float) -> dict:
+    # Settings are read at import time, so point them somewhere disposable
+    # before anything from cozymeal is imported.
+    data_dir = tempfile.mkdtemp(prefix="cozymeal-bench-")
+    os.environ["LAST_CHECKED_DIR"] = data_dir
+    os.environ.setdefault("MAX_REQUESTS_PER_SECOND", "0")
+    for name in ("EMAIL_PASSWORD", "EMAIL_USERNAME", "RECEIVER_EMAIL"):
+        os.environ.setdefault(name, "bench")
+
+    from bench.server import FixtureServer, render_page
+    from cozymeal import articles as cza, sources as czsrc, store as czs
+    from cozymeal.sources import Source
+
+    server = FixtureServer(pages, latency).start()
+    source = czsrc.DEFAULT_SOURCE = Source("bench", server.url, "Sarah")
+    try:
+        # Parse time on its own, without any network.
+        bodies = [render_page(server.template, page).decode() for page in range(1, min(pages, 10) + 1)]
+        start = time.perf_counter()
+        for body in bodies:
+            cza._parse_archive_page(body)
+        parse_time = (time.perf_counter() - start) / len(bodies)
+
+        # The first refresh has nothing to cut off at, so it crawls and
+        # stores the whole archive.
+        start = time.perf_counter()
+        merged = czs.refresh_articles([source])
+        cold_time = time.perf_counter() - start
+        cold_requests = server.requests
+
+        # Same full crawl again: every page is unchanged, so nothing is re-parsed.
+        start = time.perf_counter()
+        for _ in cza.iter_articles(source=source):
+            pass
+        warm_time = time.perf_counter() - start
+
+        # The hourly case: the refresh stops once it is back at what the
+        # last one already stored.
+        server.requests = 0
+        start = time.perf_counter()
+        czs.refresh_articles([source])
+        incremental_time = time.perf_counter() - start
+        incremental_requests = server.requests
+    finally:
+        server.stop()
+
+    return {
+        "pages": pages,
+        "articles": merged,
+        "requests": cold_requests,
+        "pages_per_second": pages / cold_time,
+        "parse_ms_per_page": parse_time * 1000,
+        "cold_crawl_s": cold_time,
+        "warm_crawl_s": warm_time,
+        "incremental_crawl_s": incremental_time,
+        "incremental_requests": incremental_requests,
+        "peak_rss_mib": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every response")
+    parser.add_argument("--json", action="store_true", help="print raw results as JSON lines")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run(args.pages[0], args.latency)))
+        return
+
+    results = []
+    for pages in args.pages:
+        output = subprocess.run(
+            [sys.executable, "-m", "bench.crawl", "--child", "--pages", str(pages), "--latency", str(args.latency)],
+            check=True, capture_output=True, text=True,
+        ).stdout
+        results.append(json.loads(output.splitlines()[-1]))
+
+    if args.json:
+        for result in results:
+            print(json.dumps(result))
+        return
+
+    print(f"{'pages':>6} {'pages/s':>9} {'parse ms':>9} {'cold s':>8} {'warm s':>8} {'incr s':>8} {'incr req':>9} {'RSS MiB':>8}")
+    for r in results:
+        print(
+            f"{r['pages']:>6} {r['pages_per_second']:>9.1f} {r['parse_ms_per_page']:>9.3f} {r['cold_crawl_s']:>8.3f}"
+            f" {r['warm_crawl_s']:>8.3f} {r['incremental_crawl_s']:>8.3f} {r['incremental_requests']:>9} {r['peak_rss_mib']:>8.1f}"
+        )
+
+if __name__ == "__main__":
+    main()
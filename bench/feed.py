@@ -0,0 +1,72 @@
+"""Measure what a feed poll costs: a rebuild, a cached 200 and a 304.
+
+Run from the repository root:
+
+    python -m bench.feed [--articles N] [--requests N]
+
+Requests go through Flask's test client, so the numbers are the app's own
+cost without any network.
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+os.environ.setdefault("LAST_CHECKED_DIR", tempfile.mkdtemp(prefix="cozymeal-bench-"))
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+for name in ("EMAIL_PASSWORD", "EMAIL_USERNAME", "RECEIVER_EMAIL"):
+    os.environ.setdefault(name, "bench@example.com")
+
+from app import app
+from bench.search import make_articles
+from cozymeal import feed as czfd, store as czs
+
+def measure(client, path: str, requests: int, status: int, **headers: str) -> float:
+    start = time.perf_counter()
+    for _ in range(requests):
+        response = client.get(path, headers=headers)
+        response.get_data()
+        assert response.status_code == status, response.status_code
+    return (time.perf_counter() - start) / requests
+
+def measure_rebuild(client, requests: int) -> float:
+    elapsed = 0.0
+    for _ in range(requests):
+        czfd._feed = None
+        start = time.perf_counter()
+        client.get("/feed.xml").get_data()
+        elapsed += time.perf_counter() - start
+    return elapsed / requests
+
+def measure_lookup(requests: int) -> float:
+    # The feed's own share of a poll, without Flask and Werkzeug around it.
+    with app.test_request_context("/feed.xml"):
+        start = time.perf_counter()
+        for _ in range(requests):
+            czfd.get_feed("http://localhost/")
+        return (time.perf_counter() - start) / requests
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--articles", type=int, default=5000)
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args()
+
+    czs.merge_articles(make_articles(args.articles))
+    czs.set_meta(czs.REFRESHED_AT_KEY, str(time.time()))
+    client = app.test_client()
+    etag = client.get("/feed.xml").headers["ETag"]
+
+    print(f"{args.articles} stored articles, {args.requests} requests each")
+    for name, seconds in (
+        ("rebuild", measure_rebuild(client, max(args.requests // 20, 1))),
+        ("cached 200", measure(client, "/feed.xml", args.requests, 200)),
+        ("304", measure(client, "/feed.xml", args.requests, 304, **{"If-None-Match": etag})),
+        ("feed lookup", measure_lookup(args.requests * 10)),
+        ("/articles 200", measure(client, "/articles?since=2000-01-01", args.requests // 10, 200)),
+    ):
+        print(f"{name:>14}: {seconds * 1e6:8.1f} us/request")
+
+if __name__ == "__main__":
+    main()
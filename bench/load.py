@@ -0,0 +1,117 @@
+"""Compare how many concurrent requests gunicorn serves with sync and threaded workers.
+
+Run from the repository root:
+
+    python -m bench.load [--clients N] [--requests N] [--latency SECONDS]
+
+Each request waits `--latency` seconds before reaching the app, standing in
+for a slow store read or a slow client, so that throughput is bounded by how
+many requests can wait at once rather than by CPU.
+"""
+
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime as dt, timedelta as tdelta
+
+# The server processes inherit these, so they have to be set before either
+# side imports cozymeal.
+os.environ.setdefault("LAST_CHECKED_DIR", tempfile.mkdtemp(prefix="cozymeal-bench-"))
+for name in ("EMAIL_PASSWORD", "EMAIL_USERNAME", "RECEIVER_EMAIL"):
+    os.environ.setdefault(name, "bench@example.com")
+
+# gunicorn reads gunicorn.conf.py from the working directory on its own, so
+# the sync mode has to override its thread count too.
+MODES = {
+    "sync": ["--worker-class", "sync", "--workers", "2", "--threads", "1"],
+    "gthread": ["--config", "gunicorn.conf.py"],
+}
+
+def application(environ, start_response):
+    # The app as the server sees it, delayed by the simulated I/O wait.
+    from app import app
+
+    time.sleep(float(os.environ.get("BENCH_LATENCY", "0")))
+    return app(environ, start_response)
+
+def seed_store(count: int) -> None:
+    from cozymeal import settings, store as czs
+    from cozymeal.articles import Article
+
+    start = dt(2025, 1, 1, tzinfo=settings.DEFAULT_TZ)
+    czs.merge_articles(
+        Article(f"Recipe &amp; Story {i}", f"https://www.cozymeal.com/magazine/article-{i}", start - tdelta(hours=i), "bench")
+        for i in range(count)
+    )
+    czs.set_meta(czs.REFRESHED_AT_KEY, str(time.time()))
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def wait_until_up(url: str, timeout: float = 10.0) -> None:
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            urllib.request.urlopen(url).read()
+            return
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.1)
+
+def fetch(url: str) -> float:
+    start = time.perf_counter()
+    with urllib.request.urlopen(url) as response:
+        response.read()
+    return time.perf_counter() - start
+
+def run(mode: str, clients: int, requests: int, latency: float) -> tuple[float, list[float]]:
+    port = free_port()
+    url = f"http://127.0.0.1:{port}/articles"
+    server = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", *MODES[mode], "--bind", f"127.0.0.1:{port}", "bench.load:application"],
+        env={**os.environ, "BENCH_LATENCY": str(latency)},
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        wait_until_up(url)
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=clients) as executor:
+            timings = list(executor.map(fetch, [url] * requests))
+        return time.perf_counter() - start, timings
+    finally:
+        server.terminate()
+        server.wait()
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=160)
+    parser.add_argument("--latency", type=float, default=0.1)
+    parser.add_argument("--articles", type=int, default=1000)
+    args = parser.parse_args()
+
+    seed_store(args.articles)
+
+    print(f"{args.clients} clients, {args.requests} requests, {args.latency * 1000:.0f} ms of I/O each")
+    for mode in MODES:
+        elapsed, timings = run(mode, args.clients, args.requests, args.latency)
+        print(
+            f"{mode:>8}: {args.requests / elapsed:7.1f} req/s, "
+            f"{args.requests * args.latency / elapsed:5.1f} requests in flight, "
+            f"p50 {statistics.median(timings) * 1000:7.1f} ms, "
+            f"max {max(timings) * 1000:7.1f} ms"
+        )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""Compare parsing an archive page with BeautifulSoup against the JSON-LD extractor.
+
+Run from the repository root:
+
+    python -m bench.parse [--repeat N]
+"""
+
+import argparse
+import time
+import tracemalloc
+
+from bs4 import BeautifulSoup
+from cozymeal import articles as cza
+from cozymeal.sources import DEFAULT_SOURCE
+from pathlib import Path
+from typing import Callable
+
+FIXTURE = Path(__file__).parent / "fixtures" / "archive_page.html"
+
+def parse_with_soup(raw_data: str) -> list[cza.Article]:
+    # The parser as it was before the extractor: a full DOM, then a scan of
+    # every script tag.
+    soup = BeautifulSoup(raw_data, "html.parser")
+    scripts = filter(lambda s: "Sarah" in s.text, soup.find_all("script"))
+    page_of_articles = [a for a in map(cza._get_article_from_script, scripts) if a]
+    for article in page_of_articles:
+        article.source = DEFAULT_SOURCE.name
+
+    return page_of_articles
+
+def measure(parse: Callable[[str], list[cza.Article]], raw_data: str, repeat: int) -> tuple[float, int]:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        parse(raw_data)
+    elapsed = (time.perf_counter() - start) / repeat
+
+    tracemalloc.start()
+    parse(raw_data)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return elapsed, peak
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    raw_data = FIXTURE.read_text().replace("{{PAGE}}", "1")
+    expected = [a.to_dict() for a in parse_with_soup(raw_data)]
+    assert [a.to_dict() for a in cza._parse_archive_page(raw_data)] == expected
+
+    print(f"{len(raw_data) / 1024:.1f} KiB page, {len(expected)} articles, {args.repeat} runs")
+    for name, parse in (("BeautifulSoup", parse_with_soup), ("JSON-LD extractor", cza._parse_archive_page)):
+        elapsed, peak = measure(parse, raw_data, args.repeat)
+        print(f"{name:>18}: {elapsed * 1000:8.3f} ms/page, {peak / 1024:8.1f} KiB peak")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""Compare rendering a digest per recipient against rendering it once and addressing it.
+
+Run from the repository root:
+
+    python -m bench.render [--articles N] [--recipients N]
+"""
+
+import argparse
+import os
+import time
+
+for name in ("EMAIL_PASSWORD", "EMAIL_USERNAME", "RECEIVER_EMAIL"):
+    os.environ.setdefault(name, "bench@example.com")
+
+from cozymeal import emails as cze, settings
+from cozymeal.articles import Article
+from datetime import datetime as dt, timedelta as tdelta
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+
+LEGACY_HTML = cze.get_environment().from_string("""\
+<p>Some new articles were published from your backlog!</p>
+{% for article in articles %}
+<p>
+    <b>{{article.get_pretty_date()}}</b>:
+    <a href="{{article.url}}">{{article.get_pretty_title()}}</a>
+</p>
+{% endfor %}""")
+
+def make_articles(count: int) -> list[Article]:
+    start = dt(2025, 1, 1, tzinfo=settings.DEFAULT_TZ)
+    return [
+        Article(f"Recipe &amp; Story {i}", f"https://www.cozymeal.com/magazine/article-{i}", start - tdelta(hours=i))
+        for i in range(count)
+    ]
+
+def send_legacy(articles: list[Article], recipients: list[str]) -> int:
+    # The digest as it was built before: concatenated text, the whole
+    # template and a fresh MIME tree for every recipient.
+    total = 0
+    for recipient in recipients:
+        text = cze.BASE_TEXT
+        for article in articles:
+            text += "\n"
+            text += f"{article.get_pretty_date()}: {article.get_pretty_title()} ({article.url})"
+        html = LEGACY_HTML.render(articles=articles)
+
+        message = MIMEMultipart("alternative")
+        message["Subject"] = cze.EMAIL_SUBJECT
+        message["From"] = settings.SENDER_EMAIL
+        message["To"] = recipient
+        message["Cc"] = settings.SENDER_EMAIL
+        message.attach(MIMEText(text, "plain"))
+        message.attach(MIMEText(html, "html"))
+        total += len(message.as_string())
+
+    return total
+
+def send_cached(articles: list[Article], recipients: list[str]) -> int:
+    message = cze.build_message(*cze.render_digest(articles))
+    return sum(len(cze.address_message(message, recipient)) for recipient in recipients)
+
+def measure(send, articles: list[Article], recipients: list[str]) -> float:
+    start = time.perf_counter()
+    send(articles, recipients)
+    return time.perf_counter() - start
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--articles", type=int, default=1000)
+    parser.add_argument("--recipients", type=int, default=500)
+    args = parser.parse_args()
+
+    articles = make_articles(args.articles)
+    recipients = [f"subscriber{i}@example.com" for i in range(args.recipients)]
+    assert cze.render_digest(articles)[1] == LEGACY_HTML.render(articles=articles)
+    cze._render_article.cache_clear()
+
+    print(f"{args.articles} articles, {args.recipients} recipients")
+    for name, send in (("per recipient", send_legacy), ("cold cache", send_cached), ("warm cache", send_cached)):
+        elapsed = measure(send, articles, recipients)
+        print(f"{name:>14}: {elapsed * 1000:9.1f} ms total, {elapsed / len(recipients) * 1e6:8.1f} us/recipient")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""Measure title search through the inverted index against scanning every title.
+
+Run from the repository root:
+
+    python -m bench.search [--articles N] [--repeat N]
+
+The articles are merged into a throwaway store first, so the index build
+is timed the way a fresh process does it: from the store, without a crawl.
+"""
+
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+os.environ.setdefault("LAST_CHECKED_DIR", tempfile.mkdtemp(prefix="cozymeal-bench-"))
+for name in ("EMAIL_PASSWORD", "EMAIL_USERNAME", "RECEIVER_EMAIL"):
+    os.environ.setdefault(name, "bench@example.com")
+
+from cozymeal import search as czq, settings, store as czs
+from cozymeal.articles import Article
+from datetime import datetime as dt, timedelta as tdelta
+
+WORDS = """
+apple bread butter cake caramel cheese chicken chili chocolate cookie crab
+cream curry dumpling egg fish garlic ginger honey lamb lemon lime mango
+noodle onion orange pasta peach pepper pie pizza pork potato pumpkin rice
+salad salmon sauce shrimp soup steak sugar taco tofu tomato vanilla waffle
+best easy quick classic homemade healthy spicy sweet crispy creamy simple
+recipes ideas guide tips ways dishes meals night dinner brunch holiday
+""".split()
+
+QUERIES = ["chocolate", "ch", "c", "easy chicken", "creamy tomato soup", "best recipes", "zucchini", "&amp;"]
+
+def make_articles(count: int) -> list[Article]:
+    rng = random.Random(0)
+    start = dt(2025, 1, 1, tzinfo=settings.DEFAULT_TZ)
+    return [
+        Article(
+            " ".join(rng.choices(WORDS, k=rng.randint(3, 8))).title() + f" &amp; More {i}",
+            f"https://www.cozymeal.com/magazine/article-{i}",
+            start - tdelta(hours=i),
+            "bench",
+        )
+        for i in range(count)
+    ]
+
+def scan(articles: list[Article], query: str, limit: int) -> list[Article]:
+    # What searching took without an index: every title, every time.
+    terms = query.lower().split()
+    matches = [a for a in articles if all(term in a.get_pretty_title().lower() for term in terms)]
+    return sorted(matches, key=lambda a: a.date_published, reverse=True)[:limit]
+
+def time_query(search, query: str, repeat: int) -> list[float]:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        search(query)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--articles", type=int, default=50000)
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--limit", type=int, default=settings.ARTICLES_PAGE_SIZE)
+    args = parser.parse_args()
+
+    articles = make_articles(args.articles)
+    czs.merge_articles(articles)
+
+    start = time.perf_counter()
+    index = czq.SearchIndex()
+    index.sync()
+    print(f"{len(index)} articles, index built from the store in {(time.perf_counter() - start) * 1000:.0f} ms")
+
+    print(f"{'query':>20} {'matches':>8} {'index p50':>10} {'p99':>8} {'sync+query':>11} {'scan p50':>9}")
+    for query in QUERIES:
+        matches = len(index.search(query))
+        indexed = time_query(lambda q: index.search(q, args.limit), query, args.repeat)
+        synced = time_query(lambda q: (index.sync(), index.search(q, args.limit)), query, args.repeat)
+        scanned = time_query(lambda q: scan(articles, q, args.limit), query, max(args.repeat // 10, 1))
+        print(
+            f"{query!r:>20} {matches:8d} "
+            f"{statistics.median(indexed) * 1000:8.3f}ms "
+            f"{statistics.quantiles(indexed, n=100)[98] * 1000:6.3f}ms "
+            f"{statistics.median(synced) * 1000:9.3f}ms "
+            f"{statistics.median(scanned) * 1000:7.1f}ms"
+        )
+
+if __name__ == "__main__":
+    main()
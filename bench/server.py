@@ -0,0 +1,68 @@
+"""Local stand-in for a Cozymeal author archive, replaying the recorded fixture page."""
+
+import re
+import threading
+import time
+
+from datetime import datetime as dt, timedelta as tdelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlparse
+
+FIXTURE = Path(__file__).parent / "fixtures" / "archive_page.html"
+TIMESTAMP_PATTERN = re.compile(r"\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}[+-]\d{2}:\d{2}")
+
+# The fixture spans 36 days; shifting each page back by that much keeps the
+# archive in date order.
+DAYS_PER_PAGE = 36
+
+def render_page(template: str, page: int) -> bytes:
+    offset = tdelta(days=DAYS_PER_PAGE * (page - 1))
+    shift = lambda m: (dt.fromisoformat(m.group(0)) - offset).isoformat()
+    return TIMESTAMP_PATTERN.sub(shift, template.replace("{{PAGE}}", str(page))).encode()
+
+class FixtureServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, pages: int, latency: float = 0.0):
+        super().__init__(("127.0.0.1", 0), FixtureRequestHandler)
+        self.pages = pages
+        self.latency = latency
+        self.template = FIXTURE.read_text()
+        self.requests = 0
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/magazine/authors/sarah-salisbury"
+
+    def start(self) -> "FixtureServer":
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+
+class FixtureRequestHandler(BaseHTTPRequestHandler):
+    server: FixtureServer
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self) -> None:
+        self.server.requests += 1
+        page = int(parse_qs(urlparse(self.path).query).get("page", ["1"])[0])
+        time.sleep(self.server.latency)
+
+        if page > self.server.pages:
+            self.send_error(404)
+            return
+
+        body = render_page(self.server.template, page)
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args) -> None:
+        pass
@@ -0,0 +1,101 @@
+"""Measure how long the app takes to import and to answer its first request.
+
+Run from the repository root:
+
+    python -m bench.startup [--runs N] [--budget-ms MS]
+
+Import time comes from `python -X importtime -c "import app"` in a fresh
+interpreter per run; time to first response from starting gunicorn with
+gunicorn.conf.py until it answers. With --budget-ms the run fails when the
+median import time goes over the budget.
+"""
+
+import argparse
+import os
+import re
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+
+IMPORT_TIME_PATTERN = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( +)(\S+)")
+
+for name in ("EMAIL_PASSWORD", "EMAIL_USERNAME", "RECEIVER_EMAIL"):
+    os.environ.setdefault(name, "bench@example.com")
+os.environ.setdefault("LAST_CHECKED_DIR", tempfile.mkdtemp(prefix="cozymeal-bench-"))
+
+def measure_import() -> tuple[float, dict[str, float]]:
+    # Returns the cumulative time for app and for each module it imports
+    # directly, in seconds.
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    total = 0.0
+    children = {}
+    for match in IMPORT_TIME_PATTERN.finditer(result.stderr):
+        _, cumulative, indent, module = match.groups()
+        if module == "app":
+            total = int(cumulative) / 1e6
+        elif len(indent) == 3:
+            children[module] = int(cumulative) / 1e6
+
+    return total, children
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def measure_first_response(timeout: float = 30.0) -> float:
+    # Any answer counts, including the 503 sent before the first crawl.
+    port = free_port()
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "--config", "gunicorn.conf.py", "--bind", f"127.0.0.1:{port}", "app:app"],
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        while time.perf_counter() - start < timeout:
+            try:
+                urllib.request.urlopen(f"http://127.0.0.1:{port}/articles").read()
+            except urllib.error.HTTPError:
+                pass
+            except OSError:
+                time.sleep(0.01)
+                continue
+            return time.perf_counter() - start
+
+        raise TimeoutError(f"gunicorn didn't answer within {timeout} seconds")
+    finally:
+        server.terminate()
+        server.wait()
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=8)
+    parser.add_argument("--budget-ms", type=float)
+    args = parser.parse_args()
+
+    runs = [measure_import() for _ in range(args.runs)]
+    import_time = statistics.median(total for total, _ in runs)
+    print(f"import app: {import_time * 1000:7.1f} ms (median of {args.runs})")
+    _, children = runs[-1]
+    for module, seconds in sorted(children.items(), key=lambda item: item[1], reverse=True)[:args.top]:
+        print(f"  {module:<24} {seconds * 1000:7.1f} ms")
+
+    first_response = statistics.median(measure_first_response() for _ in range(args.runs))
+    print(f"first response: {first_response * 1000:7.1f} ms (median of {args.runs})")
+
+    if args.budget_ms is not None and import_time * 1000 > args.budget_ms:
+        sys.exit(f"import app took {import_time * 1000:.1f} ms, over the budget of {args.budget_ms:.1f} ms")
+
+if __name__ == "__main__":
+    main()
@@ -1,82 +1,355 @@
-import requests
 import json
+import re
+import struct
+import threading
 
-from bs4 import BeautifulSoup
-from bs4.element import Script
+from concurrent.futures import ThreadPoolExecutor
+from cozymeal import fetch as czf, metrics as czm, page_cache as czp, settings, sources as czsrc
+from cozymeal.sources import Source
 from datetime import datetime as dt
+from hashlib import sha256
 from html import unescape
 from itertools import count
+from json import JSONDecodeError
+from typing import TYPE_CHECKING, Iterator
 
-BASE_ARCHIVE_URL = "https://www.cozymeal.com/magazine/authors/sarah-salisbury"
+if TYPE_CHECKING:
+    from bs4.element import Script
+
+JSON_LD_TYPE = "application/ld+json"
+
+# Script contents can't contain "</script", so a lazy match finds each one
+# without building a DOM. Comments are matched too so that commented-out
+# scripts are skipped rather than picked up.
+SCRIPT_PATTERN = re.compile(r"<!--.*?-->|<script\b([^>]*)>(.*?)</script\s*>", re.DOTALL | re.IGNORECASE)
+SCRIPT_TYPE_PATTERN = re.compile(r"""(?:^|\s)type\s*=\s*["']?([^"'\s>]+)""", re.IGNORECASE)
+
+# Binary form of an article: the byte lengths of its UTF-8 title, URL, source
+# and ISO publication and modification dates, followed by the five of them.
+# Dates stay ISO because fromisoformat() is quicker than any arithmetic on a
+# timestamp.
+BINARY_HEADER = struct.Struct("<IIIBB")
 
 class Article:
-    def __init__(self, title: str, url: str, date_published: dt):
+    # Crawls create thousands of these, so they don't carry a __dict__. Two
+    # articles are the same article when they share a URL. `updated` marks an
+    # article that is in a digest because it was edited, not published.
+    __slots__ = ("title", "url", "date_published", "source", "date_modified", "updated", "_pretty_title", "_pretty_date")
+
+    def __init__(
+        self,
+        title: str,
+        url: str,
+        date_published: dt,
+        source: str | None = None,
+        date_modified: dt | None = None,
+        updated: bool = False,
+    ):
         self.title = title
         self.url = url
         self.date_published = date_published
+        self.source = source
+        self.date_modified = date_modified
+        self.updated = updated
+        self._pretty_title = None
+        self._pretty_date = None
 
     def get_pretty_title(self):
-        return unescape(self.title)
+        if self._pretty_title is None:
+            self._pretty_title = unescape(self.title)
+        return self._pretty_title
 
     def get_pretty_date(self):
-        return self.date_published.strftime("%m/%d/%Y")
+        if self._pretty_date is None:
+            self._pretty_date = self.date_published.strftime("%m/%d/%Y")
+        return self._pretty_date
+
+    def get_fingerprint(self) -> str:
+        # Changes whenever anything shown about the article does.
+        date_modified = self.date_modified.isoformat() if self.date_modified else ""
+        content = "\0".join((self.title, self.date_published.isoformat(), date_modified))
+        return sha256(content.encode()).hexdigest()[:16]
 
     def __str__(self):
         return f"{self.get_pretty_title()} ({self.get_pretty_date()})"
 
+    def __repr__(self):
+        return f"Article({self.title!r}, {self.url!r}, {self.date_published!r}, {self.source!r})"
+
+    def __eq__(self, other):
+        if not isinstance(other, Article):
+            return NotImplemented
+        return self.url == other.url
+
+    def __hash__(self):
+        return hash(self.url)
+
+    def to_dict(self) -> dict:
+        return {
+            "title": self.title,
+            "url": self.url,
+            "date_published": self.date_published.isoformat(),
+            "source": self.source,
+            "date_modified": self.date_modified.isoformat() if self.date_modified else None,
+            "updated": self.updated,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Article":
+        date_modified = data.get("date_modified")
+        return cls(
+            data["title"],
+            data["url"],
+            dt.fromisoformat(data["date_published"]),
+            data.get("source"),
+            dt.fromisoformat(date_modified) if date_modified else None,
+            data.get("updated", False),
+        )
+
+    def to_bytes(self) -> bytes:
+        # `updated` only means something inside a digest, so it isn't kept.
+        date_modified = self.date_modified.isoformat() if self.date_modified else ""
+        fields = [
+            s.encode()
+            for s in (self.title, self.url, self.source or "", self.date_published.isoformat(), date_modified)
+        ]
+        return BINARY_HEADER.pack(*map(len, fields)) + b"".join(fields)
+
+    @classmethod
+    def from_bytes(cls, data: bytes, offset: int = 0) -> tuple["Article", int]:
+        # Returns the article and the offset just past it, so that packed
+        # articles can be read back one after another.
+        title_length, url_length, source_length, date_length, modified_length = BINARY_HEADER.unpack_from(data, offset)
+        title_start = offset + BINARY_HEADER.size
+        title_end = title_start + title_length
+        url_end = title_end + url_length
+        source_end = url_end + source_length
+        date_end = source_end + date_length
+        modified_end = date_end + modified_length
+
+        article = cls(
+            data[title_start:title_end].decode(),
+            data[title_end:url_end].decode(),
+            dt.fromisoformat(data[source_end:date_end].decode()),
+            data[url_end:source_end].decode() or None,
+            dt.fromisoformat(data[date_end:modified_end].decode()) if modified_length else None,
+        )
+        return article, modified_end
+
+def pack_articles(articles: list[Article]) -> bytes:
+    return b"".join(a.to_bytes() for a in articles)
+
+def unpack_articles(data: bytes) -> list[Article]:
+    articles = []
+    offset = 0
+    while offset < len(data):
+        article, offset = Article.from_bytes(data, offset)
+        articles.append(article)
+
+    return articles
+
+class CrawlStats:
+    def __init__(self):
+        self.pages_fetched = 0
+        self.pages_skipped = 0
+        self.bytes_downloaded = 0
+        self.bytes_saved = 0
+        self._lock = threading.Lock()
+
+    def record(self, downloaded: int = 0, saved: int = 0, skipped: bool = False) -> None:
+        with self._lock:
+            self.pages_fetched += 1
+            self.pages_skipped += skipped
+            self.bytes_downloaded += downloaded
+            self.bytes_saved += saved
+
+    def to_dict(self) -> dict:
+        return {
+            "pages_fetched": self.pages_fetched,
+            "pages_skipped": self.pages_skipped,
+            "bytes_downloaded": self.bytes_downloaded,
+            "bytes_saved": self.bytes_saved,
+        }
+
+    def __str__(self):
+        return ", ".join(f"{key}={value}" for key, value in self.to_dict().items())
+
 def _get_date_published(script_data: dict) -> dt:
     date_published_raw = script_data["datePublished"]
     date_published = dt.fromisoformat(date_published_raw)
     return date_published
 
-def _get_article_from_script(script: Script) -> Article | None:
-    text: str = script.text.strip(" \n")
-    script_data = json.loads(text)
+def _get_date_modified(script_data: dict) -> dt | None:
+    # Unlike the publication date this is optional, so a missing or malformed
+    # value doesn't cost us the article.
+    try:
+        return dt.fromisoformat(script_data["dateModified"])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+def _get_article_from_json_ld(text: str) -> Article | None:
+    # Pages carry other JSON-LD too (breadcrumbs, lists of several items,
+    # broken markup), none of which should cost us the rest of the page.
+    try:
+        script_data = json.loads(text.strip(" \n"))
+    except JSONDecodeError:
+        return None
+
+    if not isinstance(script_data, dict):
+        return None
 
     try:
         title = script_data["name"]
         url = script_data["mainEntityOfPage"]["@id"]
         date_published = _get_date_published(script_data)
-    except (KeyError, ValueError):
+    except (KeyError, TypeError, ValueError):
         return None
 
-    return Article(title, url, date_published)
+    return Article(title, url, date_published, date_modified=_get_date_modified(script_data))
 
-def _get_articles_from_archive_page(page: int) -> list[Article]:
-    archive_response = requests.get(f"{BASE_ARCHIVE_URL}?page={page}")
-    try:
-        archive_response.raise_for_status()
-    except requests.exceptions.HTTPError as e:
-        return []
-    raw_data = archive_response.text
+def _get_article_from_script(script: "Script") -> Article | None:
+    return _get_article_from_json_ld(script.text)
+
+def _iter_json_ld_scripts(raw_data: str) -> Iterator[str]:
+    for match in SCRIPT_PATTERN.finditer(raw_data):
+        attrs, text = match.groups()
+        if text is None:
+            continue
+
+        # Untyped scripts are kept as well, since they may still hold JSON-LD.
+        script_type = SCRIPT_TYPE_PATTERN.search(attrs)
+        if script_type and script_type.group(1).lower() != JSON_LD_TYPE:
+            continue
+
+        yield text
 
-    soup = BeautifulSoup(raw_data, "html.parser")
-    scripts = filter(lambda s: "Sarah" in s.text, soup.find_all("script"))
+def _parse_archive_page(raw_data: str, source: Source | None = None) -> list[Article]:
+    source = source or czsrc.DEFAULT_SOURCE
+    scripts = _iter_json_ld_scripts(raw_data)
+    if source.author:
+        scripts = filter(lambda s: source.author in s, scripts)
 
     page_of_articles = []
     for script in scripts:
-        article = _get_article_from_script(script)
+        article = _get_article_from_json_ld(script)
         if not article:
             continue
 
+        article.source = source.name
+
         page_of_articles.append(article)
 
     return page_of_articles
 
-def get_articles() -> list[Article]:
-    articles = []
-    for i in count(start=1):
-        page_of_articles = _get_articles_from_archive_page(i)
-        if not page_of_articles:
-            break
+def _get_articles_from_cached_page(cached_page: czp.CachedPage, source: Source) -> list[Article]:
+    page_of_articles = unpack_articles(cached_page.articles)
+    for article in page_of_articles:
+        article.source = source.name
 
-        articles.extend(page_of_articles)
+    return page_of_articles
 
-    return articles
+def _get_articles_from_archive_page(page: int, stats: CrawlStats | None = None, source: Source | None = None) -> list[Article]:
+    source = source or czsrc.DEFAULT_SOURCE
+    stats = stats or CrawlStats()
+    url = f"{source.url}?page={page}"
+    cached_page = czp.get_page(url)
+
+    with czm.timed("fetch", url=url):
+        archive_response = czf.get(url, headers=czp.get_conditional_headers(cached_page))
+    if cached_page and archive_response.status_code == 304:
+        stats.record(saved=cached_page.content_length, skipped=True)
+        return _get_articles_from_cached_page(cached_page, source)
+
+    # Only a missing page marks the end of the archive. Anything else that is
+    # still failing after the fetch layer's retries has to fail the crawl, or
+    # a flaky page would silently truncate it.
+    if archive_response.status_code in czf.NOT_FOUND_STATUSES:
+        return []
+
+    archive_response.raise_for_status()
+    raw_data = archive_response.text
+    content_length = len(raw_data.encode())
+
+    # Servers that don't support conditional requests still let us skip the
+    # parse when the body hasn't changed.
+    content_hash = sha256(raw_data.encode()).hexdigest()
+    if cached_page and cached_page.content_hash == content_hash:
+        stats.record(downloaded=content_length, skipped=True)
+        page_of_articles = _get_articles_from_cached_page(cached_page, source)
+    else:
+        stats.record(downloaded=content_length)
+        with czm.timed("parse", url=url):
+            page_of_articles = _parse_archive_page(raw_data, source)
+
+    czp.set_page(url, czp.CachedPage(
+        etag=archive_response.headers.get("ETag"),
+        last_modified=archive_response.headers.get("Last-Modified"),
+        content_hash=content_hash,
+        content_length=content_length,
+        articles=pack_articles(page_of_articles),
+    ))
+
+    return page_of_articles
+
+def _is_date_ordered(page_of_articles: list[Article], previous_oldest: dt | None) -> bool:
+    dates = [a.date_published for a in page_of_articles]
+    if any(newer < older for newer, older in zip(dates, dates[1:])):
+        return False
+
+    return previous_oldest is None or dates[0] <= previous_oldest
+
+def _iter_archive_pages(workers: int, stats: CrawlStats | None = None, source: Source | None = None) -> Iterator[list[Article]]:
+    # Keep `workers` pages in flight ahead of the one being consumed, yielding
+    # them in page order. Pages fetched past the end are simply discarded.
+    executor = ThreadPoolExecutor(max_workers=workers)
+    pending = {}
+    next_page = 1
+    try:
+        for page in count(start=1):
+            while next_page < page + workers:
+                pending[next_page] = executor.submit(_get_articles_from_archive_page, next_page, stats, source)
+                next_page += 1
+
+            yield pending.pop(page).result()
+    finally:
+        executor.shutdown(cancel_futures=True)
+
+def iter_articles(
+    cutoff: dt | None = None,
+    workers: int | None = None,
+    stats: CrawlStats | None = None,
+    source: Source | None = None,
+) -> Iterator[Article]:
+    # The archive lists the newest articles first, so once a page reaches past
+    # the cutoff no later page can hold anything newer. If a page ever breaks
+    # that ordering, stop trusting it and crawl the whole archive instead.
+    # A post published mid-crawl pushes older articles onto the next page,
+    # so the same article can turn up twice; only its first sighting counts.
+    seen = set()
+    date_ordered = True
+    previous_oldest = None
+    pages = _iter_archive_pages(workers or settings.CRAWL_WORKERS, stats, source)
+    try:
+        for page_of_articles in pages:
+            if not page_of_articles:
+                break
+
+            for article in page_of_articles:
+                if article not in seen:
+                    seen.add(article)
+                    yield article
 
-def get_new_articles(last_checked) -> filter:
-    articles = get_articles()
-    sorted_articles = sorted(articles, key=lambda a: a.date_published, reverse=True)
-    filtered_articles = filter(lambda a: a.date_published >= last_checked, sorted_articles)
+            date_ordered = date_ordered and _is_date_ordered(page_of_articles, previous_oldest)
+            previous_oldest = page_of_articles[-1].date_published
+            if cutoff and date_ordered and previous_oldest < cutoff:
+                break
+    finally:
+        pages.close()
 
-    return filtered_articles
\ No newline at end of file
+def get_articles(
+    cutoff: dt | None = None,
+    workers: int | None = None,
+    stats: CrawlStats | None = None,
+    source: Source | None = None,
+) -> list[Article]:
+    return list(iter_articles(cutoff, workers, stats, source))
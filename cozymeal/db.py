@@ -0,0 +1,52 @@
+import sqlite3
+import threading
+
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator, Sequence
+
+_migrated = set()
+_migrated_lock = threading.Lock()
+
+def _execute_script(connection: sqlite3.Connection, script: str) -> None:
+    # executescript() would commit the surrounding transaction, so run the
+    # statements one at a time instead.
+    for statement in script.split(";"):
+        if statement.strip():
+            connection.execute(statement)
+
+def _migrate(connection: sqlite3.Connection, schema: str, migrations: Sequence[str]) -> None:
+    # `schema` always describes the latest layout and `migrations` bring older
+    # files up to it, tracked through user_version. A new file is created from
+    # the schema directly.
+    connection.execute("BEGIN IMMEDIATE")
+    try:
+        version = connection.execute("PRAGMA user_version").fetchone()[0]
+        is_new = not connection.execute("SELECT 1 FROM sqlite_master LIMIT 1").fetchone()
+        if not is_new:
+            for migration in migrations[version:]:
+                _execute_script(connection, migration)
+
+        _execute_script(connection, schema)
+        connection.execute(f"PRAGMA user_version = {len(migrations)}")
+        connection.execute("COMMIT")
+    except BaseException:
+        connection.execute("ROLLBACK")
+        raise
+
+@contextmanager
+def connect(filename: Path, schema: str, migrations: Sequence[str] = ()) -> Iterator[sqlite3.Connection]:
+    # WAL lets the gunicorn workers keep reading while one of them writes.
+    connection = sqlite3.connect(filename, timeout=30, isolation_level=None)
+    try:
+        with _migrated_lock:
+            if filename not in _migrated:
+                connection.execute("PRAGMA journal_mode=WAL")
+                _migrate(connection, schema, migrations)
+                _migrated.add(filename)
+
+        connection.isolation_level = ""
+        with connection:
+            yield connection
+    finally:
+        connection.close()
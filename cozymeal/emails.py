@@ -1,54 +1,95 @@
-import smtplib, ssl
-
-from cozymeal import settings
+from contextlib import contextmanager
+from cozymeal import metrics as czm, settings
 from cozymeal.articles import Article
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-from jinja2 import Environment, PackageLoader, select_autoescape
+from datetime import datetime as dt
+from functools import cache, lru_cache
+from markupsafe import Markup
+from typing import TYPE_CHECKING, Iterator
 
-jenv = Environment(
-    loader=PackageLoader("cozymeal"),
-    autoescape=select_autoescape()
-)
+if TYPE_CHECKING:
+    from jinja2 import Environment, Template
+    from smtplib import SMTP
 
-PORT = 465
 BASE_TEXT = """\
 Some new articles were published from your backlog!
 """
-BASE_HTML = jenv.get_template("email.html")
+BASE_HTML = "email.html"
+ARTICLE_HTML = "email_article.html"
 EMAIL_SUBJECT = "New Cozymeal Articles"
 
-def _format_articles_for_email(articles: list[Article]) -> tuple[str, str]:
-    text = BASE_TEXT
-    for article in articles:
-        text += "\n"
-        text += f"{article.get_pretty_date()}: {article.get_pretty_title()} ({article.url})"
+# Jinja, the MIME classes and the SMTP/TLS stack are only loaded once a
+# digest is actually built or sent, which most processes never do.
+@cache
+def get_environment() -> "Environment":
+    from jinja2 import Environment, PackageLoader, select_autoescape
+
+    return Environment(
+        loader=PackageLoader("cozymeal"),
+        autoescape=select_autoescape()
+    )
+
+def get_template(name: str) -> "Template":
+    return get_environment().get_template(name)
+
+# Most articles show up in digest after digest, so their rendered lines are
+# kept rather than going back through Jinja each time.
+ARTICLE_CACHE_SIZE = 4096
+
+@lru_cache(maxsize=ARTICLE_CACHE_SIZE)
+def _render_article(title: str, url: str, date_published: dt, updated: bool) -> tuple[str, Markup]:
+    article = Article(title, url, date_published, updated=updated)
+    text = f"{article.get_pretty_date()}: {article.get_pretty_title()} ({article.url})"
+    if updated:
+        text += " (updated)"
+    return text, Markup(get_template(ARTICLE_HTML).render(article=article))
 
-    html = BASE_HTML.render(articles=articles)
+def render_digest(articles: list[Article]) -> tuple[str, str]:
+    with czm.timed("render", articles=len(articles)):
+        lines, fragments = [BASE_TEXT], []
+        for article in articles:
+            text, html = _render_article(article.title, article.url, article.date_published, article.updated)
+            lines.append(text)
+            fragments.append(html)
 
-    return text, html
+        return "\n".join(lines), get_template(BASE_HTML).render(fragments=fragments)
+
+def build_message(text: str, html: str) -> bytes:
+    # Everything but the To header is shared by every recipient of a digest,
+    # so the message is serialized once and addressed per recipient.
+    from email.mime.multipart import MIMEMultipart
+    from email.mime.text import MIMEText
+    from email.policy import compat32
 
-def get_message_for_email(articles: list[Article]) -> MIMEMultipart:
     message = MIMEMultipart("alternative")
     message["Subject"] = EMAIL_SUBJECT
     message["From"] = settings.SENDER_EMAIL
-    message["To"] = settings.RECEIVER_EMAIL
     message["Cc"] = settings.SENDER_EMAIL
 
-    text, html = _format_articles_for_email(articles)
-
     part1 = MIMEText(text, "plain")
     part2 = MIMEText(html, "html")
 
     message.attach(part1)
     message.attach(part2)
 
-    return message
+    return message.as_bytes(policy=compat32.clone(linesep="\r\n"))
+
+def address_message(message: bytes, recipient: str) -> bytes:
+    return f"To: {recipient}\r\n".encode() + message
+
+@contextmanager
+def smtp_connection() -> Iterator["SMTP"]:
+    import smtplib, ssl
+
+    if settings.SMTP_SSL:
+        server = smtplib.SMTP_SSL(settings.SMTP_HOST, settings.SMTP_PORT, context=ssl.create_default_context())
+    else:
+        server = smtplib.SMTP(settings.SMTP_HOST, settings.SMTP_PORT)
 
-def send_email_for_articles(articles: list[Article]) -> None:
-    context = ssl.create_default_context()
-    message = get_message_for_email(articles)
+    with server:
+        if settings.EMAIL_PASSWORD:
+            server.login(settings.SENDER_EMAIL, settings.EMAIL_PASSWORD)
+        yield server
 
-    with smtplib.SMTP_SSL("smtp.gmail.com", PORT, context=context) as server:
-        server.login(settings.SENDER_EMAIL, settings.EMAIL_PASSWORD)
-        server.sendmail(settings.SENDER_EMAIL, settings.RECEIVER_EMAIL, message.as_string())
+def send_message(server: "SMTP", recipient: str, message: bytes) -> None:
+    with czm.timed("smtp_send"):
+        server.sendmail(settings.SENDER_EMAIL, recipient, message)
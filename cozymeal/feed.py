@@ -0,0 +1,60 @@
+import hashlib
+import threading
+import time
+
+from cozymeal import settings, store as czs
+from datetime import datetime as dt, timezone
+from flask import render_template
+from typing import NamedTuple
+
+FEED_TEMPLATE = "feed.xml"
+
+class Feed(NamedTuple):
+    version: int
+    base_url: str
+    body: bytes
+    etag: str
+    last_modified: dt | None
+
+# The feed only changes when the articles do, so it is rendered once per
+# store version and every poll in between is served the same bytes. The
+# version itself is only looked up every FEED_CHECK_INTERVAL seconds.
+_feed = None
+_checked_at = 0.0
+_lock = threading.Lock()
+
+def _render(version: int, base_url: str) -> Feed:
+    changed_at = czs.get_changed_at()
+    updated = dt.fromtimestamp(changed_at or 0, timezone.utc)
+    body = render_template(
+        FEED_TEMPLATE,
+        articles=czs.query_articles(limit=settings.FEED_SIZE),
+        feed_url=f"{base_url}feed.xml",
+        site_url=base_url,
+        updated=updated,
+    ).encode()
+
+    # The ETag is strong: it changes whenever a single byte of the body does.
+    etag = hashlib.sha256(body).hexdigest()[:32]
+    last_modified = updated.replace(microsecond=0) if changed_at else None
+    return Feed(version, base_url, body, etag, last_modified)
+
+def get_feed(base_url: str) -> Feed | None:
+    # Must run inside a request, to render the template. The feed links
+    # back to wherever it was requested from, so each base URL gets its own.
+    # There is no feed until the first crawl is in.
+    global _feed, _checked_at
+    feed = _feed
+    now = time.monotonic()
+    if feed and feed.base_url == base_url and now - _checked_at < settings.FEED_CHECK_INTERVAL:
+        return feed
+
+    with _lock:
+        if czs.get_refreshed_at() is None:
+            return None
+
+        version = czs.get_version()
+        if not _feed or _feed.version != version or _feed.base_url != base_url:
+            _feed = _render(version, base_url)
+        _checked_at = now
+        return _feed
@@ -0,0 +1,122 @@
+import threading
+import time
+
+from cozymeal import metrics as czm, settings
+from cozymeal.ratelimit import AdaptiveLimiter
+from datetime import datetime as dt, timezone
+from email.utils import parsedate_to_datetime
+from typing import TYPE_CHECKING
+from urllib.parse import urlsplit
+
+if TYPE_CHECKING:
+    import requests
+
+# Statuses worth retrying, as opposed to the archive telling us a page doesn't
+# exist. Every retry happens in get() rather than in urllib3, so that the
+# host's limiter sees each attempt: throttling holds back every request to
+# the host, and errors and timeouts cut how many are in flight.
+TRANSIENT_STATUSES = (500, 502, 504)
+THROTTLE_STATUSES = (429, 503)
+NOT_FOUND_STATUSES = (404, 410)
+
+_session = None
+_limiters = {}
+_session_lock = threading.Lock()
+
+def _create_session() -> "requests.Session":
+    # requests is only imported by whoever crawls first, not by every process
+    # that imports the articles.
+    import requests
+
+    from requests.adapters import HTTPAdapter
+
+    adapter = HTTPAdapter(pool_maxsize=settings.CRAWL_WORKERS * settings.SOURCE_WORKERS)
+
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+def get_session() -> "requests.Session":
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = _create_session()
+
+        return _session
+
+def get_limiter(host: str) -> AdaptiveLimiter:
+    with _session_lock:
+        if host not in _limiters:
+            _limiters[host] = AdaptiveLimiter(
+                settings.MAX_REQUESTS_PER_SECOND,
+                burst=settings.MAX_REQUESTS_BURST,
+                concurrency=settings.CRAWL_WORKERS,
+                max_concurrency=settings.FETCH_MAX_CONCURRENCY,
+                latency_tolerance=settings.FETCH_LATENCY_TOLERANCE,
+            )
+
+        return _limiters[host]
+
+def _get_backoff(attempt: int) -> float:
+    return settings.FETCH_BACKOFF * 2 ** attempt
+
+def _get_retry_after(response: "requests.Response", attempt: int) -> float:
+    # Retry-After is either a number of seconds or a date. Without one, fall
+    # back to our own backoff; either way never wait longer than configured.
+    backoff = _get_backoff(attempt)
+    value = response.headers.get("Retry-After", "").strip()
+    try:
+        retry_after = float(value)
+    except ValueError:
+        try:
+            retry_after = (parsedate_to_datetime(value) - dt.now(timezone.utc)).total_seconds()
+        except (TypeError, ValueError):
+            retry_after = backoff
+
+    return min(max(retry_after, 0.0), settings.FETCH_MAX_RETRY_AFTER)
+
+def get(url: str, headers: dict[str, str] | None = None) -> "requests.Response":
+    # A response that is still throttled or failing after every retry is
+    # returned as is, for the caller to fail on; a request that still can't
+    # get a response raises.
+    import requests
+
+    limiter = get_limiter(urlsplit(url).netloc)
+    for attempt in range(settings.FETCH_RETRIES + 1):
+        is_last_attempt = attempt == settings.FETCH_RETRIES
+        started = limiter.acquire()
+        try:
+            response = get_session().get(
+                url,
+                headers=headers,
+                timeout=(settings.CONNECT_TIMEOUT, settings.READ_TIMEOUT),
+            )
+        except requests.Timeout:
+            czm.increment("fetch_timeouts")
+            limiter.release(started, timed_out=True)
+            if is_last_attempt:
+                raise
+            time.sleep(_get_backoff(attempt))
+            continue
+        except requests.ConnectionError:
+            limiter.release(started, failed=True)
+            if is_last_attempt:
+                raise
+            time.sleep(_get_backoff(attempt))
+            continue
+        except BaseException:
+            limiter.release(started, failed=True)
+            raise
+
+        if response.status_code in THROTTLE_STATUSES:
+            czm.increment("fetch_throttled")
+            limiter.release(started, throttled=True, retry_after=_get_retry_after(response, attempt))
+            continue
+
+        limiter.release(started, response.status_code)
+        if response.status_code not in TRANSIENT_STATUSES or is_last_attempt:
+            return response
+        time.sleep(_get_backoff(attempt))
+
+    return response
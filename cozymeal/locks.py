@@ -0,0 +1,21 @@
+import fcntl
+
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator
+
+@contextmanager
+def file_lock(filename: Path, blocking: bool = True) -> Iterator[bool]:
+    # flock is shared by every process on the volume, so all gunicorn workers
+    # agree on who holds it. Yields whether the lock was acquired.
+    with open(filename, "a") as file:
+        try:
+            fcntl.flock(file, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+
+        try:
+            yield True
+        finally:
+            fcntl.flock(file, fcntl.LOCK_UN)
@@ -0,0 +1,189 @@
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+
+from contextlib import contextmanager
+from cozymeal import settings
+from typing import Iterator
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+FLUSH_INTERVAL = 1.0
+
+logger = logging.getLogger(__name__)
+
+# Each gunicorn worker keeps its own numbers and periodically writes them to
+# METRICS_DIR, so that whichever worker answers /metrics can report the sum.
+# Numbers recorded since the last write go out at most FLUSH_INTERVAL later,
+# and at exit.
+_histograms = {}
+_counters = {}
+_dirty = False
+_lock = threading.Lock()
+_flush_lock = threading.Lock()
+_flush_timer = None
+_last_flush = 0.0
+
+def _new_histogram() -> dict:
+    return {"buckets": [0] * len(BUCKETS), "sum": 0.0, "count": 0, "errors": 0}
+
+def _snapshot_filename():
+    return settings.METRICS_DIR / f"{os.getpid()}.json"
+
+def _is_running(pid: str) -> bool:
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except (PermissionError, ValueError):
+        pass
+
+    return True
+
+def _schedule_flush() -> None:
+    global _flush_timer
+    with _lock:
+        if not _dirty or _flush_timer is not None:
+            return
+        _flush_timer = threading.Timer(FLUSH_INTERVAL, _flush_later)
+        _flush_timer.daemon = True
+        _flush_timer.start()
+
+def _flush_later() -> None:
+    global _flush_timer
+    with _lock:
+        _flush_timer = None
+
+    flush()
+
+def _flush(force: bool = False) -> None:
+    # Threads of the same worker share one snapshot file. A thread that finds
+    # another one already flushing leaves it to that one, unless it has to
+    # see its own numbers written out.
+    global _dirty, _last_flush
+    if not _flush_lock.acquire(blocking=force):
+        return
+
+    try:
+        now = time.monotonic()
+        if _dirty and (force or now - _last_flush >= FLUSH_INTERVAL):
+            _last_flush = now
+            with _lock:
+                data = json.dumps({"histograms": _histograms, "counters": _counters})
+                _dirty = False
+
+            settings.METRICS_DIR.mkdir(parents=True, exist_ok=True)
+            filename = _snapshot_filename()
+            temp_filename = filename.with_suffix(".tmp")
+            temp_filename.write_text(data)
+            os.replace(temp_filename, filename)
+    finally:
+        _flush_lock.release()
+
+    # Whatever was recorded too soon after the last write, or by a thread
+    # that found this one flushing, still gets written out.
+    _schedule_flush()
+
+def flush() -> None:
+    _flush(force=True)
+
+atexit.register(flush)
+
+def observe(stage: str, seconds: float, ok: bool = True) -> None:
+    global _dirty
+    with _lock:
+        histogram = _histograms.setdefault(stage, _new_histogram())
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                histogram["buckets"][i] += 1
+        histogram["sum"] += seconds
+        histogram["count"] += 1
+        histogram["errors"] += not ok
+        _dirty = True
+
+    _flush()
+
+def increment(name: str, value: float = 1) -> None:
+    global _dirty
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + value
+        _dirty = True
+
+    _flush()
+
+def record(stage: str, seconds: float, ok: bool = True, **fields) -> None:
+    observe(stage, seconds, ok)
+    logger.info(json.dumps({
+        "event": "timing",
+        "stage": stage,
+        "duration_ms": round(seconds * 1000, 3),
+        "ok": ok,
+        **fields,
+    }))
+
+@contextmanager
+def timed(stage: str, **fields) -> Iterator[None]:
+    start = time.perf_counter()
+    ok = True
+    try:
+        yield
+    except BaseException:
+        ok = False
+        raise
+    finally:
+        record(stage, time.perf_counter() - start, ok, **fields)
+
+def _collect() -> dict:
+    # Our own numbers are flushed first, so every worker, this one included,
+    # is read back from its file. Files left behind by workers that have
+    # since exited are removed, or they would pile up as workers restart.
+    flush()
+    histograms = {}
+    counters = {}
+    for filename in settings.METRICS_DIR.glob("*.json"):
+        if not _is_running(filename.stem):
+            filename.unlink(missing_ok=True)
+            continue
+
+        try:
+            data = json.loads(filename.read_text())
+        except (OSError, ValueError):
+            continue
+
+        for stage, histogram in data["histograms"].items():
+            total = histograms.setdefault(stage, _new_histogram())
+            total["buckets"] = [a + b for a, b in zip(total["buckets"], histogram["buckets"])]
+            for key in ("sum", "count", "errors"):
+                total[key] += histogram[key]
+        for name, value in data["counters"].items():
+            counters[name] = counters.get(name, 0) + value
+
+    return {"histograms": histograms, "counters": counters}
+
+def render() -> str:
+    data = _collect()
+    lines = [
+        "# HELP cozymeal_stage_duration_seconds Time spent in each stage of a request or crawl.",
+        "# TYPE cozymeal_stage_duration_seconds histogram",
+    ]
+    for stage, histogram in sorted(data["histograms"].items()):
+        for bound, count in zip(BUCKETS, histogram["buckets"]):
+            lines.append(f'cozymeal_stage_duration_seconds_bucket{{stage="{stage}",le="{bound}"}} {count}')
+        lines.append(f'cozymeal_stage_duration_seconds_bucket{{stage="{stage}",le="+Inf"}} {histogram["count"]}')
+        lines.append(f'cozymeal_stage_duration_seconds_sum{{stage="{stage}"}} {histogram["sum"]}')
+        lines.append(f'cozymeal_stage_duration_seconds_count{{stage="{stage}"}} {histogram["count"]}')
+
+    lines += [
+        "# HELP cozymeal_stage_errors_total Stages that ended with an exception.",
+        "# TYPE cozymeal_stage_errors_total counter",
+    ]
+    for stage, histogram in sorted(data["histograms"].items()):
+        lines.append(f'cozymeal_stage_errors_total{{stage="{stage}"}} {histogram["errors"]}')
+
+    for name, value in sorted(data["counters"].items()):
+        lines.append(f"# TYPE cozymeal_{name}_total counter")
+        lines.append(f"cozymeal_{name}_total {value}")
+
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,192 @@
+import json
+import logging
+import threading
+import time
+
+from cozymeal import db, emails as cze, locks, settings
+from cozymeal.articles import Article
+from cozymeal.ratelimit import RateLimiter
+from cozymeal.subscribers import Subscriber, load_subscribers
+from typing import NamedTuple
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    recipient TEXT NOT NULL,
+    articles TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL,
+    sent_at REAL,
+    last_error TEXT
+);
+CREATE INDEX IF NOT EXISTS messages_by_next_attempt ON messages (sent_at, next_attempt_at);
+CREATE TABLE IF NOT EXISTS sent_articles (
+    url TEXT PRIMARY KEY,
+    fingerprint TEXT NOT NULL
+);
+"""
+
+logger = logging.getLogger(__name__)
+
+_wakeup = threading.Event()
+_sender = None
+_sender_lock = threading.Lock()
+
+class OutboxMessage(NamedTuple):
+    id: int
+    recipient: str
+    articles: list[Article]
+    attempts: int
+
+def _connect():
+    return db.connect(settings.OUTBOX_FILENAME, SCHEMA)
+
+def get_unsent_articles(articles: list[Article]) -> list[Article]:
+    # An edited article has a new fingerprint, so it can be sent again.
+    with _connect() as connection:
+        sent = dict(connection.execute(
+            "SELECT url, fingerprint FROM sent_articles WHERE url IN (SELECT value FROM json_each(?))",
+            (json.dumps([a.url for a in articles]),),
+        ).fetchall())
+
+    return [a for a in articles if sent.get(a.url) != a.get_fingerprint()]
+
+def enqueue(articles: list[Article], subscribers: list[Subscriber] | None = None) -> list[int]:
+    # Once this returns the digest is on disk, so the caller can move its
+    # cursors forward even if sending hasn't happened yet. Subscribers whose
+    # filters match none of the articles get nothing. The articles count as
+    # sent from the same transaction, so they're never queued twice.
+    subscribers = subscribers if subscribers is not None else load_subscribers()
+    rows = []
+    now = time.time()
+    for subscriber in subscribers:
+        matching = [a for a in articles if subscriber.matches(a)]
+        if matching:
+            rows.append((subscriber.email, json.dumps([a.to_dict() for a in matching]), now, now))
+
+    with _connect() as connection:
+        ids = [
+            connection.execute(
+                "INSERT INTO messages (recipient, articles, created_at, next_attempt_at) VALUES (?, ?, ?, ?)",
+                row,
+            ).lastrowid
+            for row in rows
+        ]
+        connection.executemany("""
+            INSERT INTO sent_articles (url, fingerprint) VALUES (?, ?)
+            ON CONFLICT (url) DO UPDATE SET fingerprint = excluded.fingerprint
+        """, [(a.url, a.get_fingerprint()) for a in articles])
+
+    _wakeup.set()
+    return ids
+
+def get_due_messages(limit: int = 100, after: int = 0) -> list[OutboxMessage]:
+    with _connect() as connection:
+        rows = connection.execute("""
+            SELECT id, recipient, articles, attempts FROM messages
+            WHERE sent_at IS NULL AND attempts < ? AND next_attempt_at <= ? AND id > ?
+            ORDER BY id LIMIT ?
+        """, (settings.OUTBOX_MAX_ATTEMPTS, time.time(), after, limit)).fetchall()
+
+    return [
+        OutboxMessage(id, recipient, [Article.from_dict(a) for a in json.loads(articles)], attempts)
+        for id, recipient, articles, attempts in rows
+    ]
+
+def mark_sent(message_id: int) -> None:
+    with _connect() as connection:
+        connection.execute("UPDATE messages SET sent_at = ? WHERE id = ?", (time.time(), message_id))
+
+def mark_failed(message: OutboxMessage, error: Exception) -> None:
+    backoff = min(settings.OUTBOX_RETRY_BACKOFF * 2 ** message.attempts, settings.OUTBOX_MAX_BACKOFF)
+    with _connect() as connection:
+        connection.execute("""
+            UPDATE messages SET attempts = attempts + 1, next_attempt_at = ?, last_error = ?
+            WHERE id = ?
+        """, (time.time() + backoff, repr(error), message.id))
+
+    if message.attempts + 1 >= settings.OUTBOX_MAX_ATTEMPTS:
+        logger.error(
+            "Giving up on the digest to %s after %d attempts: %r",
+            message.recipient, message.attempts + 1, error,
+        )
+
+def prune() -> int:
+    # Sent messages and ones that were given up on are only kept around for
+    # a while, to look into what happened to them.
+    cutoff = time.time() - settings.OUTBOX_RETENTION
+    with _connect() as connection:
+        return connection.execute("""
+            DELETE FROM messages
+            WHERE sent_at < ? OR (sent_at IS NULL AND attempts >= ? AND created_at < ?)
+        """, (cutoff, settings.OUTBOX_MAX_ATTEMPTS, cutoff)).rowcount
+
+def _send_batch(messages: list[OutboxMessage], limiter: RateLimiter, rendered: dict) -> int:
+    import smtplib
+
+    sent = 0
+    handled = 0
+    try:
+        with cze.smtp_connection() as server:
+            for message in messages:
+                # Subscribers with the same filters get the same articles, so
+                # each distinct digest is only rendered once per drain.
+                key = tuple((a.get_fingerprint(), a.url, a.updated) for a in message.articles)
+                if key not in rendered:
+                    rendered[key] = cze.build_message(*cze.render_digest(message.articles))
+
+                limiter.wait()
+                try:
+                    cze.send_message(server, message.recipient, cze.address_message(rendered[key], message.recipient))
+                except smtplib.SMTPRecipientsRefused as e:
+                    mark_failed(message, e)
+                else:
+                    mark_sent(message.id)
+                    sent += 1
+                handled += 1
+    except (smtplib.SMTPException, OSError) as e:
+        # The connection itself is gone; everything not yet handled waits
+        # for the next attempt.
+        logger.warning("Sending queued email failed: %r", e)
+        for message in messages[handled:]:
+            mark_failed(message, e)
+
+    return sent
+
+def drain() -> int:
+    # Only one process sends at a time; the others leave it to that one.
+    with locks.file_lock(settings.OUTBOX_LOCK_FILENAME, blocking=False) as locked:
+        if not locked:
+            return 0
+
+        # Every batch goes over one logged-in session. Batches only move
+        # forward through the queue, so a message that fails isn't retried
+        # until a later drain.
+        limiter = RateLimiter(settings.SMTP_MAX_MESSAGES_PER_SECOND)
+        rendered = {}
+        sent = 0
+        after = 0
+        while messages := get_due_messages(settings.SMTP_BATCH_SIZE, after):
+            sent += _send_batch(messages, limiter, rendered)
+            after = messages[-1].id
+
+        prune()
+        return sent
+
+def _run_sender() -> None:
+    while True:
+        _wakeup.clear()
+        try:
+            drain()
+        except Exception:
+            logger.exception("Outbox sender failed")
+
+        _wakeup.wait(settings.OUTBOX_POLL_INTERVAL)
+
+def start_sender() -> None:
+    global _sender
+    with _sender_lock:
+        if _sender is None:
+            _sender = threading.Thread(target=_run_sender, name="outbox-sender", daemon=True)
+            _sender.start()
@@ -0,0 +1,52 @@
+from cozymeal import db, settings
+from typing import NamedTuple
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS pages (
+    url TEXT PRIMARY KEY,
+    etag TEXT,
+    last_modified TEXT,
+    content_hash TEXT NOT NULL,
+    content_length INTEGER NOT NULL,
+    articles BLOB NOT NULL
+);
+"""
+
+# Each change to how cached articles are stored just drops the cache; the
+# next crawl fills it again.
+MIGRATIONS = (
+    "DELETE FROM pages",
+    "DELETE FROM pages",
+)
+
+class CachedPage(NamedTuple):
+    etag: str | None
+    last_modified: str | None
+    content_hash: str
+    content_length: int
+    articles: bytes
+
+def get_page(url: str) -> CachedPage | None:
+    with db.connect(settings.PAGE_CACHE_FILENAME, SCHEMA, MIGRATIONS) as connection:
+        row = connection.execute("""
+            SELECT etag, last_modified, content_hash, content_length, articles
+            FROM pages WHERE url = ?
+        """, (url,)).fetchone()
+
+    return CachedPage(*row) if row else None
+
+def set_page(url: str, page: CachedPage) -> None:
+    with db.connect(settings.PAGE_CACHE_FILENAME, SCHEMA, MIGRATIONS) as connection:
+        connection.execute("""
+            INSERT OR REPLACE INTO pages (url, etag, last_modified, content_hash, content_length, articles)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, (url, *page))
+
+def get_conditional_headers(page: CachedPage | None) -> dict[str, str]:
+    headers = {}
+    if page and page.etag:
+        headers["If-None-Match"] = page.etag
+    if page and page.last_modified:
+        headers["If-Modified-Since"] = page.last_modified
+
+    return headers
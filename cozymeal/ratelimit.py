@@ -0,0 +1,119 @@
+import threading
+import time
+
+class RateLimiter:
+    def __init__(self, rate: float):
+        self.rate = rate
+        self._next_slot = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self) -> None:
+        if self.rate <= 0:
+            return
+
+        # Hand out evenly spaced slots and sleep outside the lock until ours.
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + 1 / self.rate
+
+        time.sleep(slot - now)
+
+class AdaptiveLimiter:
+    # Paces requests to one host with a token bucket and caps how many are in
+    # flight with AIMD: every fast, successful response raises the cap by
+    # 1/cap (about one per round of requests), and a throttled, timed-out,
+    # failing (5xx) or slow one halves it. Responses to requests sent before the last cut don't cut it
+    # again, so one burst of 429s costs a single halving. A Retry-After holds
+    # every request back until it has passed.
+    # Slow is judged against a moving average of recent latencies, kept per
+    # status class: a 304 or a 404 costs the server far less than a full
+    # page, and one quick response mustn't set the bar for good.
+    def __init__(
+        self,
+        rate: float,
+        burst: int = 1,
+        concurrency: int = 4,
+        max_concurrency: int = 16,
+        latency_tolerance: float = 3.0,
+        min_slow_latency: float = 0.25,
+        baseline_weight: float = 0.2,
+    ):
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self.limit = float(max(concurrency, 1))
+        self.max_concurrency = max(max_concurrency, 1)
+        self.latency_tolerance = latency_tolerance
+        self.min_slow_latency = min_slow_latency
+        self.baseline_weight = baseline_weight
+        self.in_flight = 0
+        self._tokens = float(self.burst)
+        self._refilled_at = time.monotonic()
+        self._paused_until = 0.0
+        self._decreased_at = 0.0
+        self._baselines = {}
+        self._condition = threading.Condition()
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.burst, self._tokens + (now - self._refilled_at) * self.rate)
+        self._refilled_at = now
+
+    def acquire(self) -> float:
+        # Returns when the request was let through, to hand back to release().
+        with self._condition:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    self._condition.wait(self._paused_until - now)
+                    continue
+                if self.in_flight >= int(self.limit):
+                    self._condition.wait()
+                    continue
+                if self.rate > 0:
+                    self._refill(now)
+                    if self._tokens < 1:
+                        self._condition.wait((1 - self._tokens) / self.rate)
+                        continue
+                    self._tokens -= 1
+
+                self.in_flight += 1
+                return now
+
+    def _is_slow(self, latency: float, status: int | None) -> bool:
+        # Slow means well past the usual latency for this kind of response,
+        # ignoring differences too small to be the server struggling. Slow
+        # responses still feed the average, so a server that has simply got
+        # slower becomes the new normal after a few rounds.
+        status_class = status // 100 if status else None
+        baseline = self._baselines.get(status_class, latency)
+        self._baselines[status_class] = baseline + (latency - baseline) * self.baseline_weight
+        return latency > max(baseline * self.latency_tolerance, self.min_slow_latency)
+
+    def release(
+        self,
+        started: float,
+        status: int | None = None,
+        throttled: bool = False,
+        retry_after: float = 0.0,
+        failed: bool = False,
+        timed_out: bool = False,
+    ) -> None:
+        # A request that failed without a response or a timeout (a refused
+        # connection, say) says nothing about how busy the server is, so it
+        # only frees its slot. A timeout is the slowest response there is.
+        with self._condition:
+            now = time.monotonic()
+            self.in_flight -= 1
+            if throttled:
+                self._paused_until = max(self._paused_until, now + retry_after)
+                self._tokens = 0.0
+            if not failed:
+                overloaded = throttled or timed_out or (status is not None and status >= 500)
+                if overloaded or self._is_slow(now - started, status):
+                    if started >= self._decreased_at:
+                        self.limit = max(1.0, self.limit / 2)
+                        self._decreased_at = now
+                else:
+                    self.limit = min(self.max_concurrency, self.limit + 1 / self.limit)
+
+            self._condition.notify_all()
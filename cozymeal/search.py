@@ -0,0 +1,198 @@
+import heapq
+import re
+import threading
+
+from bisect import bisect_left
+from cozymeal import store as czs
+from cozymeal.articles import Article
+from datetime import datetime as dt
+from typing import Callable
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+# Sorts after any word that starts with the same prefix.
+PREFIX_END = chr(0x10FFFF)
+
+# Checking an article's words costs about this many times more than handling
+# it as part of a set, which decides when scanning for matches beats
+# collecting them.
+SCAN_COST = 8
+
+def tokenize(text: str) -> list[str]:
+    return TOKEN_PATTERN.findall(text.casefold())
+
+class SearchIndex:
+    # Maps every word of the titles as they're displayed to the URLs of the
+    # articles using it. The words are also kept sorted, so that all words
+    # starting with a prefix sit in one slice found by bisection, and the
+    # URLs newest first. Both are only re-sorted on the first search after
+    # the index changes, so a crawl's worth of articles costs one sort.
+    def __init__(self):
+        self.version = -1
+        self._postings = {}
+        self._articles = {}
+        self._keys = {}
+        self._words_by_url = {}
+        self._words = []
+        self._newest = []
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._articles)
+
+    def _remove(self, url: str) -> None:
+        if url not in self._articles:
+            return
+
+        del self._articles[url]
+        del self._keys[url]
+        for word in self._words_by_url.pop(url):
+            urls = self._postings[word]
+            urls.discard(url)
+            if not urls:
+                del self._postings[word]
+
+    def add(self, articles: list[Article]) -> None:
+        # An article already in the index is replaced, since its title may
+        # have changed.
+        if not articles:
+            return
+
+        with self._lock:
+            for article in articles:
+                self._remove(article.url)
+                words = tuple(set(tokenize(article.get_pretty_title())))
+                self._articles[article.url] = article
+                self._keys[article.url] = (article.date_published.timestamp(), article.url)
+                self._words_by_url[article.url] = words
+                for word in words:
+                    if word not in self._postings:
+                        self._postings[word] = set()
+                    self._postings[word].add(article.url)
+
+            self._words = None
+            self._newest = None
+
+    def sync(self) -> None:
+        # Pulls in whatever the store has merged since the last sync; the
+        # first one reads every stored article, so nothing is recrawled.
+        with self._sync_lock:
+            articles, version = czs.get_changed_articles(self.version)
+            self.add(articles)
+            self.version = version
+
+    def _get_words(self) -> list[str]:
+        if self._words is None:
+            self._words = sorted(self._postings)
+        return self._words
+
+    def _get_newest(self) -> list[str]:
+        if self._newest is None:
+            self._newest = sorted(self._keys, key=self._keys.__getitem__, reverse=True)
+        return self._newest
+
+    def _scan_newest(self, terms: list[str], limit: int) -> list[str]:
+        urls = []
+        for url in self._get_newest():
+            words = self._words_by_url[url]
+            if all(any(word.startswith(term) for word in words) for term in terms):
+                urls.append(url)
+                if len(urls) == limit:
+                    break
+
+        return urls
+
+    def _get_filter(
+        self,
+        since: dt | None,
+        until: dt | None,
+        source: str | None,
+        after: tuple[float, str] | None,
+    ) -> Callable[[str], bool] | None:
+        # The same filters as store.query_articles, on the index's own sort
+        # keys, so that a search pages the way /articles does.
+        if not (since or until or source or after):
+            return None
+
+        since_ts = since.timestamp() if since else float("-inf")
+        until_ts = until.timestamp() if until else float("inf")
+        after = tuple(after) if after else None
+
+        def matches(url: str) -> bool:
+            key = self._keys[url]
+            return (
+                since_ts <= key[0] < until_ts
+                and (after is None or key < after)
+                and (source is None or self._articles[url].source == source)
+            )
+
+        return matches
+
+    def _intersect(self, terms: list[set[str]], limit: int | None, where: Callable[[str], bool] | None = None) -> list[str]:
+        matches = None
+        for urls in terms:
+            matches = urls if matches is None else matches & urls
+            if not matches:
+                return []
+
+        if where:
+            matches = [url for url in matches if where(url)]
+
+        if limit is None:
+            return sorted(matches, key=self._keys.__getitem__, reverse=True)
+        return heapq.nlargest(limit, matches, key=self._keys.__getitem__)
+
+    def search(
+        self,
+        query: str,
+        limit: int | None = None,
+        since: dt | None = None,
+        until: dt | None = None,
+        source: str | None = None,
+        after: tuple[float, str] | None = None,
+    ) -> list[Article]:
+        # Every word of the query has to start a word of the title. The
+        # newest matches come first, as everywhere else.
+        where = self._get_filter(since, until, source, after)
+        terms = sorted(set(tokenize(query)), key=len, reverse=True)
+        if not terms:
+            return []
+
+        with self._lock:
+            words = self._get_words()
+            expansions = []
+            for term in terms:
+                start = bisect_left(words, term)
+                end = bisect_left(words, term + PREFIX_END, start)
+                if start == end:
+                    return []
+                expansions.append([self._postings[word] for word in words[start:end]])
+
+            # A query matching a good share of the index finds `limit` matches
+            # sooner by checking articles newest first than by collecting
+            # every match and ranking them. How many match is estimated as if
+            # the words of a title were independent of each other. Filtered
+            # searches always collect, since the newest articles may all be
+            # outside the filters.
+            total = len(self._articles)
+            matches = total
+            for postings in expansions:
+                matches *= min(sum(map(len, postings)), total) / total
+
+            if where is None and limit is not None and matches ** 2 > SCAN_COST * limit * total:
+                urls = self._scan_newest(terms, limit)
+            else:
+                urls = self._intersect(
+                    [postings[0] if len(postings) == 1 else set().union(*postings) for postings in expansions],
+                    limit,
+                    where,
+                )
+
+            return [self._articles[url] for url in urls]
+
+_index = SearchIndex()
+
+def search(query: str, limit: int | None = None, **filters) -> list[Article]:
+    _index.sync()
+    return _index.search(query, limit, **filters)
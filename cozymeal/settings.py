@@ -1,4 +1,5 @@
 import pytz
+import tempfile
 
 from environs import env
 from pathlib import Path
@@ -7,14 +8,106 @@ env.read_env()
 
 API_TOKEN = env.str('API_TOKEN', default='')
 
-EMAIL_PASSWORD = env.str("EMAIL_PASSWORD")
-SENDER_EMAIL = env.str("EMAIL_USERNAME")
-RECEIVER_EMAIL = env.str("RECEIVER_EMAIL")
+# Importing settings never fails or touches the data directory; init() checks
+# for these and creates it, once, from whatever is about to serve or crawl.
+REQUIRED_VARIABLES = ("EMAIL_PASSWORD", "EMAIL_USERNAME", "RECEIVER_EMAIL")
+
+EMAIL_PASSWORD = env.str("EMAIL_PASSWORD", default="")
+SENDER_EMAIL = env.str("EMAIL_USERNAME", default="")
+RECEIVER_EMAIL = env.str("RECEIVER_EMAIL", default="")
 
 LAST_CHECKED_DIR = env.path("LAST_CHECKED_DIR", default=Path("/data"))
-LAST_CHECKED_DIR.mkdir(parents=True, exist_ok=True)
 
 LAST_CHECKED_FILENAME = LAST_CHECKED_DIR / 'last_checked_time.json'
 LAST_CHECKED_KEY = "last_checked_time"
+LAST_CHECKED_SOURCES_FILENAME = LAST_CHECKED_DIR / 'last_checked_sources.json'
+
+SOURCES_FILENAME = env.path("SOURCES_FILE", default=LAST_CHECKED_DIR / 'sources.json')
+SUBSCRIBERS_FILENAME = env.path("SUBSCRIBERS_FILE", default=LAST_CHECKED_DIR / 'subscribers.json')
+
+STORE_FILENAME = LAST_CHECKED_DIR / 'articles.sqlite3'
+REFRESH_LOCK_FILENAME = LAST_CHECKED_DIR / 'refresh.lock'
+WORKER_LOCK_FILENAME = LAST_CHECKED_DIR / 'worker.lock'
+STATE_DIR = LAST_CHECKED_DIR / 'state'
+DIGEST_LOCK_FILENAME = LAST_CHECKED_DIR / 'digest.lock'
+PAGE_CACHE_FILENAME = LAST_CHECKED_DIR / 'page_cache.sqlite3'
+OUTBOX_FILENAME = LAST_CHECKED_DIR / 'outbox.sqlite3'
+OUTBOX_LOCK_FILENAME = LAST_CHECKED_DIR / 'outbox.lock'
+
+# Metrics snapshots are named after the PID that wrote them, and PIDs are
+# handed out again after a reboot, so they are kept off the data volume and
+# the entrypoint clears them on every start.
+METRICS_DIR = env.path("METRICS_DIR", default=Path(tempfile.gettempdir()) / 'cozymeal-metrics')
 
 DEFAULT_TZ = pytz.timezone('America/Los_Angeles')
+
+LOG_LEVEL = env.log_level("LOG_LEVEL", default="INFO")
+
+# Seconds between outbox checks, and the retry backoff for failed sends.
+# Sent and abandoned messages are deleted after OUTBOX_RETENTION seconds.
+OUTBOX_POLL_INTERVAL = env.float("OUTBOX_POLL_INTERVAL", default=60.0)
+OUTBOX_RETRY_BACKOFF = env.float("OUTBOX_RETRY_BACKOFF", default=30.0)
+OUTBOX_MAX_BACKOFF = env.float("OUTBOX_MAX_BACKOFF", default=3600.0)
+OUTBOX_MAX_ATTEMPTS = env.int("OUTBOX_MAX_ATTEMPTS", default=20)
+OUTBOX_RETENTION = env.float("OUTBOX_RETENTION", default=7 * 24 * 3600.0)
+
+SMTP_HOST = env.str("SMTP_HOST", default="smtp.gmail.com")
+SMTP_PORT = env.int("SMTP_PORT", default=465)
+SMTP_SSL = env.bool("SMTP_SSL", default=True)
+# Messages sent over one SMTP session before reconnecting, and the cap on how
+# fast they go out. Zero turns the limit off.
+SMTP_BATCH_SIZE = env.int("SMTP_BATCH_SIZE", default=100)
+SMTP_MAX_MESSAGES_PER_SECOND = env.float("SMTP_MAX_MESSAGES_PER_SECOND", default=5.0)
+
+# gunicorn worker processes, and the threads each of them serves requests on.
+WEB_WORKERS = env.int("WEB_WORKERS", default=2)
+WEB_THREADS = env.int("WEB_THREADS", default=8)
+
+CRAWL_WORKERS = env.int("CRAWL_WORKERS", default=4)
+SOURCE_WORKERS = env.int("SOURCE_WORKERS", default=4)
+
+# Per host, so shared by every source on it. Zero turns the limit off.
+MAX_REQUESTS_PER_SECOND = env.float("MAX_REQUESTS_PER_SECOND", default=5.0)
+MAX_REQUESTS_BURST = env.int("MAX_REQUESTS_BURST", default=1)
+
+# Requests in flight to a host start at CRAWL_WORKERS and adapt between one
+# and FETCH_MAX_CONCURRENCY, dropping when the host throttles us, times out,
+# answers with a server error, or answers FETCH_LATENCY_TOLERANCE times
+# slower than its recent average for that kind of response. A Retry-After
+# longer than FETCH_MAX_RETRY_AFTER seconds is cut short.
+FETCH_MAX_CONCURRENCY = env.int("FETCH_MAX_CONCURRENCY", default=16)
+FETCH_LATENCY_TOLERANCE = env.float("FETCH_LATENCY_TOLERANCE", default=3.0)
+FETCH_MAX_RETRY_AFTER = env.float("FETCH_MAX_RETRY_AFTER", default=120.0)
+
+# Timeouts are in seconds. Retries back off by FETCH_BACKOFF * 2 ** attempt.
+CONNECT_TIMEOUT = env.float("CONNECT_TIMEOUT", default=5.0)
+READ_TIMEOUT = env.float("READ_TIMEOUT", default=30.0)
+FETCH_RETRIES = env.int("FETCH_RETRIES", default=3)
+FETCH_BACKOFF = env.float("FETCH_BACKOFF", default=0.5)
+
+# Seconds between background crawls, plus up to CRAWL_JITTER more.
+CRAWL_INTERVAL = env.int("CRAWL_INTERVAL", default=900)
+CRAWL_JITTER = env.int("CRAWL_JITTER", default=60)
+
+# Seconds between crawls that walk each source's whole archive instead of
+# stopping at the articles already stored, so that edits to older articles
+# are noticed too. Unchanged pages cost a conditional request each.
+FULL_CRAWL_INTERVAL = env.int("FULL_CRAWL_INTERVAL", default=86400)
+
+# Page sizes for GET /articles, and how long clients may reuse a response
+# before revalidating it.
+ARTICLES_PAGE_SIZE = env.int("ARTICLES_PAGE_SIZE", default=100)
+ARTICLES_MAX_PAGE_SIZE = env.int("ARTICLES_MAX_PAGE_SIZE", default=1000)
+ARTICLES_MAX_AGE = env.int("ARTICLES_MAX_AGE", default=60)
+
+# Articles in the Atom feed, how long readers may reuse it, and how often
+# the store is asked whether the feed needs rebuilding.
+FEED_SIZE = env.int("FEED_SIZE", default=50)
+FEED_MAX_AGE = env.int("FEED_MAX_AGE", default=300)
+FEED_CHECK_INTERVAL = env.float("FEED_CHECK_INTERVAL", default=5.0)
+
+def init() -> None:
+    for name in REQUIRED_VARIABLES:
+        env.str(name)
+
+    LAST_CHECKED_DIR.mkdir(parents=True, exist_ok=True)
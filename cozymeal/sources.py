@@ -0,0 +1,34 @@
+import json
+
+from cozymeal import settings
+
+class Source:
+    def __init__(self, name: str, url: str, author: str | None = None):
+        self.name = name
+        self.url = url
+        self.author = author
+
+    def to_dict(self) -> dict:
+        return {"name": self.name, "url": self.url, "author": self.author}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Source":
+        return cls(data["name"], data["url"], data.get("author"))
+
+    def __str__(self):
+        return self.name
+
+DEFAULT_SOURCE = Source(
+    "sarah-salisbury",
+    "https://www.cozymeal.com/magazine/authors/sarah-salisbury",
+    "Sarah",
+)
+
+def load_sources() -> list[Source]:
+    # Sources live on the data volume so they can be changed without a
+    # redeploy. Without a sources file, only the original author is tracked.
+    try:
+        with open(settings.SOURCES_FILENAME, 'r') as file:
+            return [Source.from_dict(data) for data in json.load(file)]
+    except FileNotFoundError:
+        return [DEFAULT_SOURCE]
@@ -0,0 +1,68 @@
+import json
+import logging
+import os
+import tempfile
+import time
+
+from cozymeal import locks, settings
+from json.decoder import JSONDecodeError
+from typing import Any, Callable
+
+# Each key is kept in a file of its own, wrapped in a record carrying this
+# version. Records written in any other layout are ignored rather than
+# misread.
+RECORD_VERSION = 1
+
+logger = logging.getLogger(__name__)
+
+def _path(key: str):
+    return settings.STATE_DIR / f"{key}.json"
+
+def _write(key: str, value: Any) -> None:
+    # Written to a temporary file and renamed over the old one, so a crash
+    # leaves either the old record or the new one, never half of either.
+    fd, temp_path = tempfile.mkstemp(dir=settings.STATE_DIR, prefix=f".{key}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as file:
+            json.dump({"version": RECORD_VERSION, "updated_at": time.time(), "value": value}, file)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp_path, _path(key))
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+    dir_fd = os.open(settings.STATE_DIR, os.O_RDONLY)
+    try:
+        os.fsync(dir_fd)
+    finally:
+        os.close(dir_fd)
+
+def get(key: str, default: Any = None) -> Any:
+    try:
+        with open(_path(key), 'r') as file:
+            record = json.load(file)
+    except FileNotFoundError:
+        return default
+    except JSONDecodeError:
+        logger.warning("Ignoring unreadable state record %s", key)
+        return default
+
+    if record.get("version") != RECORD_VERSION:
+        logger.warning("Ignoring state record %s with version %s", key, record.get("version"))
+        return default
+
+    return record["value"]
+
+def update(key: str, function: Callable[[Any], Any]) -> Any:
+    # Read-modify-write under a lock of the key's own, so concurrent workers
+    # never lose each other's changes. `function` gets None for a new key.
+    settings.STATE_DIR.mkdir(parents=True, exist_ok=True)
+    with locks.file_lock(settings.STATE_DIR / f"{key}.lock"):
+        value = function(get(key))
+        _write(key, value)
+
+    return value
+
+def put(key: str, value: Any) -> None:
+    update(key, lambda _: value)
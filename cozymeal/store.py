@@ -0,0 +1,304 @@
+import logging
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+from cozymeal import articles as cza, db, metrics as czm, settings, sources as czsrc, state
+from cozymeal.articles import Article
+from cozymeal.sources import Source
+from datetime import datetime as dt
+from itertools import islice
+from typing import Iterable
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS articles (
+    url TEXT PRIMARY KEY,
+    title TEXT NOT NULL,
+    date_published TEXT NOT NULL,
+    published_ts REAL NOT NULL,
+    source TEXT NOT NULL,
+    date_modified TEXT,
+    modified_ts REAL,
+    fingerprint TEXT NOT NULL DEFAULT '',
+    version INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS articles_by_published ON articles (published_ts, url);
+CREATE INDEX IF NOT EXISTS articles_by_version ON articles (version);
+CREATE INDEX IF NOT EXISTS articles_by_source ON articles (source, published_ts);
+CREATE INDEX IF NOT EXISTS articles_by_modified_ts ON articles (source, modified_ts);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+MIGRATIONS = (
+    "ALTER TABLE articles ADD COLUMN source TEXT NOT NULL DEFAULT 'sarah-salisbury'",
+    """
+    ALTER TABLE articles ADD COLUMN date_modified TEXT;
+    ALTER TABLE articles ADD COLUMN modified_ts REAL;
+    ALTER TABLE articles ADD COLUMN fingerprint TEXT NOT NULL DEFAULT ''
+    """,
+    "DROP INDEX IF EXISTS articles_by_published_ts",
+    "ALTER TABLE articles ADD COLUMN version INTEGER NOT NULL DEFAULT 0",
+)
+
+REFRESHED_AT_KEY = "refreshed_at"
+CRAWL_STATS_KEY = "crawl_stats"
+CRAWLED_THROUGH_KEY = "crawled_through"
+FULL_CRAWLED_AT_KEY = "full_crawled_at"
+SOURCE_REFRESHED_AT_KEY = "source_refreshed_at"
+VERSION_KEY = "version"
+CHANGED_AT_KEY = "changed_at"
+
+# Crawled articles are written in batches of this size, so a crawl holds no
+# more than one batch in memory and no write transaction spans a fetch.
+MERGE_BATCH_SIZE = 200
+
+logger = logging.getLogger(__name__)
+
+def _connect():
+    return db.connect(settings.STORE_FILENAME, SCHEMA, MIGRATIONS)
+
+ARTICLE_COLUMNS = "title, url, date_published, source, date_modified"
+
+def _article_from_row(row: tuple) -> Article:
+    title, url, date_published, source, date_modified = row
+    return Article(
+        title,
+        url,
+        dt.fromisoformat(date_published),
+        source,
+        dt.fromisoformat(date_modified) if date_modified else None,
+    )
+
+def merge_articles(articles: Iterable[Article]) -> int:
+    # An article listed by several sources keeps the first one it was seen in.
+    # Rows are only rewritten when the article's fingerprint has changed, and
+    # are tagged with the store version the merge brings, so that readers can
+    # pick up just what changed since they last looked. Taking the version
+    # first also takes the write lock; a merge that changes nothing is rolled
+    # back, version and all.
+    rows = [
+        (
+            a.url,
+            a.title,
+            a.date_published.isoformat(),
+            a.date_published.timestamp(),
+            a.source or czsrc.DEFAULT_SOURCE.name,
+            a.date_modified.isoformat() if a.date_modified else None,
+            a.date_modified.timestamp() if a.date_modified else None,
+            a.get_fingerprint(),
+        )
+        for a in articles
+    ]
+    if not rows:
+        return 0
+
+    with _connect() as connection:
+        version = _bump_version(connection)
+        before = connection.total_changes
+        connection.executemany("""
+            INSERT INTO articles (url, title, date_published, published_ts, source, date_modified, modified_ts, fingerprint, version)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (url) DO UPDATE SET
+                title = excluded.title,
+                date_published = excluded.date_published,
+                published_ts = excluded.published_ts,
+                date_modified = excluded.date_modified,
+                modified_ts = excluded.modified_ts,
+                fingerprint = excluded.fingerprint,
+                version = excluded.version
+            WHERE fingerprint != excluded.fingerprint
+        """, [(*row, version) for row in rows])
+        changed = connection.total_changes - before
+        if not changed:
+            connection.rollback()
+
+        return changed
+
+def _bump_version(connection) -> int:
+    # Anything served from the store is validated against this version, so it
+    # moves on with every change to the articles.
+    connection.execute("""
+        INSERT INTO meta (key, value) VALUES (?, '1')
+        ON CONFLICT (key) DO UPDATE SET value = CAST(value AS INTEGER) + 1
+    """, (VERSION_KEY,))
+    connection.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (CHANGED_AT_KEY, str(time.time())))
+    return int(connection.execute("SELECT value FROM meta WHERE key = ?", (VERSION_KEY,)).fetchone()[0])
+
+def query_articles(
+    since: dt | None = None,
+    until: dt | None = None,
+    source: str | None = None,
+    limit: int | None = None,
+    after: tuple[float, str] | None = None,
+) -> list[Article]:
+    # Newest first, with the URL breaking ties, so that `after` (the sort key
+    # of the last article on the previous page) resumes exactly where that
+    # page ended.
+    conditions = []
+    params = []
+    if since:
+        conditions.append("published_ts >= ?")
+        params.append(since.timestamp())
+    if until:
+        conditions.append("published_ts < ?")
+        params.append(until.timestamp())
+    if source:
+        conditions.append("source = ?")
+        params.append(source)
+    if after:
+        conditions.append("(published_ts, url) < (?, ?)")
+        params.extend(after)
+
+    where = " AND ".join(conditions) or "1"
+    with czm.timed("sort_filter"), _connect() as connection:
+        rows = connection.execute(f"""
+            SELECT {ARTICLE_COLUMNS} FROM articles
+            WHERE {where}
+            ORDER BY published_ts DESC, url DESC
+            LIMIT ?
+        """, (*params, -1 if limit is None else limit)).fetchall()
+
+    return [_article_from_row(row) for row in rows]
+
+def get_changed_articles(version: int) -> tuple[list[Article], int]:
+    # Everything merged after `version`, along with the version it brings a
+    # reader up to. Rows from before versions were tracked count as version
+    # zero, so -1 gets every article.
+    with _connect() as connection:
+        rows = connection.execute(f"""
+            SELECT {ARTICLE_COLUMNS}, version FROM articles
+            WHERE version > ?
+        """, (version,)).fetchall()
+
+    return [_article_from_row(row[:-1]) for row in rows], max((row[-1] for row in rows), default=version)
+
+def get_new_articles(cursors: dict[str, dt]) -> list[Article]:
+    # One query across every source, each with its own cutoff, so the digest
+    # comes back already in date order. Older articles whose dateModified has
+    # passed the cutoff come along too, marked as updated.
+    if not cursors:
+        return []
+
+    conditions = " OR ".join(["(source = ? AND (published_ts >= ? OR modified_ts >= ?))"] * len(cursors))
+    params = [
+        value
+        for source, since in cursors.items()
+        for value in (source, since.timestamp(), since.timestamp())
+    ]
+    with czm.timed("sort_filter"), _connect() as connection:
+        rows = connection.execute(f"""
+            SELECT {ARTICLE_COLUMNS} FROM articles
+            WHERE {conditions}
+            ORDER BY published_ts DESC
+        """, params).fetchall()
+
+    articles = [_article_from_row(row) for row in rows]
+    for article in articles:
+        article.updated = article.date_published < cursors[article.source]
+
+    return articles
+
+def get_meta(key: str) -> str | None:
+    with _connect() as connection:
+        row = connection.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+
+    return row[0] if row else None
+
+def set_meta(key: str, value: str) -> None:
+    with _connect() as connection:
+        connection.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+def get_refreshed_at() -> float | None:
+    refreshed_at = get_meta(REFRESHED_AT_KEY)
+    return float(refreshed_at) if refreshed_at else None
+
+def get_source_refreshed_at() -> dict[str, float]:
+    # When the last successful crawl of each source started.
+    return state.get(SOURCE_REFRESHED_AT_KEY) or {}
+
+def get_version() -> int:
+    return int(get_meta(VERSION_KEY) or 0)
+
+def get_changed_at() -> float | None:
+    changed_at = get_meta(CHANGED_AT_KEY)
+    return float(changed_at) if changed_at else None
+
+def get_crawled_through(source: str) -> dt | None:
+    crawled_through = (state.get(CRAWLED_THROUGH_KEY) or {}).get(source)
+    return dt.fromisoformat(crawled_through) if crawled_through else None
+
+def _set_crawled_through(source: str, date: dt) -> None:
+    def advance(marks: dict[str, str] | None) -> dict[str, str]:
+        marks = dict(marks or {})
+        current = marks.get(source)
+        if not current or dt.fromisoformat(current) < date:
+            marks[source] = date.isoformat()
+        return marks
+
+    state.update(CRAWLED_THROUGH_KEY, advance)
+
+def _is_full_crawl_due(source: str, now: float) -> bool:
+    full_crawled_at = (state.get(FULL_CRAWLED_AT_KEY) or {}).get(source)
+    return full_crawled_at is None or now - full_crawled_at >= settings.FULL_CRAWL_INTERVAL
+
+def _refresh_source(source: Source) -> tuple[int, cza.CrawlStats]:
+    # Only crawl back as far as the last crawl of this source that finished.
+    # Batches are committed as they come, so the newest stored article says
+    # nothing about the older ones: a crawl that failed halfway has stored
+    # the top of the archive but not the rest. A source that was just added
+    # gets a full crawl, and so does every source once per
+    # FULL_CRAWL_INTERVAL, since edits to articles past the cutoff are only
+    # seen by crawling their pages.
+    started_at = time.time()
+    full_crawl = _is_full_crawl_due(source.name, started_at)
+    cutoff = None if full_crawl else get_crawled_through(source.name)
+    stats = cza.CrawlStats()
+    merged = 0
+    newest = None
+    articles = cza.iter_articles(cutoff, stats=stats, source=source)
+    with czm.timed("crawl", source=source.name):
+        while batch := list(islice(articles, MERGE_BATCH_SIZE)):
+            merged += merge_articles(batch)
+            batch_newest = max(a.date_published for a in batch)
+            newest = max(newest, batch_newest) if newest else batch_newest
+    logger.info("Crawled %s: %s", source, stats)
+
+    if newest:
+        _set_crawled_through(source.name, newest)
+    if full_crawl:
+        state.update(FULL_CRAWLED_AT_KEY, lambda marks: {**(marks or {}), source.name: started_at})
+    state.update(SOURCE_REFRESHED_AT_KEY, lambda marks: {**(marks or {}), source.name: started_at})
+
+    for name, value in stats.to_dict().items():
+        czm.increment(name, value)
+
+    return merged, stats
+
+def _try_refresh_source(source: Source) -> tuple[int, cza.CrawlStats] | None:
+    # One broken archive mustn't hold back the others. It keeps its old
+    # refresh time, so the digest doesn't move past articles it never got.
+    try:
+        return _refresh_source(source)
+    except Exception:
+        logger.exception("Crawling %s failed", source)
+        czm.increment("crawl_failures")
+        return None
+
+def refresh_articles(sources: list[Source] | None = None) -> int:
+    # The store is complete up to when the crawl started, not when it ended,
+    # so that is what gets recorded, as soon as any source has been crawled.
+    started_at = time.time()
+    sources = sources or czsrc.load_sources()
+    with ThreadPoolExecutor(max_workers=settings.SOURCE_WORKERS) as executor:
+        results = dict(zip((source.name for source in sources), executor.map(_try_refresh_source, sources)))
+    crawled = {name: result for name, result in results.items() if result is not None}
+
+    if crawled:
+        set_meta(REFRESHED_AT_KEY, str(started_at))
+    state.put(CRAWL_STATS_KEY, {name: stats.to_dict() for name, (_, stats) in crawled.items()})
+    # The crawl's numbers shouldn't wait on whatever the process does next.
+    czm.flush()
+
+    return sum(merged for merged, _ in crawled.values())
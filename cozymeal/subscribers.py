@@ -0,0 +1,33 @@
+import json
+
+from cozymeal import settings
+from cozymeal.articles import Article
+
+class Subscriber:
+    def __init__(self, email: str, sources: list[str] | None = None, keywords: list[str] | None = None):
+        self.email = email
+        self.sources = sources
+        self.keywords = [keyword.lower() for keyword in keywords] if keywords else None
+
+    def matches(self, article: Article) -> bool:
+        if self.sources and article.source not in self.sources:
+            return False
+
+        if self.keywords:
+            title = article.get_pretty_title().lower()
+            return any(keyword in title for keyword in self.keywords)
+
+        return True
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Subscriber":
+        return cls(data["email"], data.get("sources"), data.get("keywords"))
+
+def load_subscribers() -> list[Subscriber]:
+    # Without a subscribers file, the single configured receiver gets every
+    # article, as before.
+    try:
+        with open(settings.SUBSCRIBERS_FILENAME, 'r') as file:
+            return [Subscriber.from_dict(data) for data in json.load(file)]
+    except FileNotFoundError:
+        return [Subscriber(settings.RECEIVER_EMAIL)]
@@ -1,9 +1,13 @@
 import json
 
-from cozymeal import settings
+from cozymeal import settings, state
+from cozymeal.sources import DEFAULT_SOURCE
 from datetime import datetime as dt, timedelta as tdel
 from flask import Request
 from json.decoder import JSONDecodeError
+from typing import Iterable
+
+CURSORS_KEY = "cursors"
 
 def get_date_a_week_ago(tz = settings.DEFAULT_TZ) -> dt:
     return dt.now(tz) - tdel(days=7)
@@ -11,11 +15,7 @@ def get_date_a_week_ago(tz = settings.DEFAULT_TZ) -> dt:
 def get_date_a_week_before(timestamp: dt) -> dt:
     return timestamp - tdel(days=7)
 
-def set_last_checked(timestamp: dt) -> None:
-    with open(settings.LAST_CHECKED_FILENAME, 'w') as file:
-        json.dump({settings.LAST_CHECKED_KEY: timestamp.isoformat()}, file)
-
-def get_last_checked() -> dt | None:
+def _get_legacy_last_checked() -> dt | None:
     try:
         with open(settings.LAST_CHECKED_FILENAME, 'r') as file:
             data = json.load(file)
@@ -23,6 +23,38 @@ def get_last_checked() -> dt | None:
     except (FileNotFoundError, KeyError, JSONDecodeError):
         return None
 
+def _get_legacy_source_cursors() -> dict[str, str]:
+    try:
+        with open(settings.LAST_CHECKED_SOURCES_FILENAME, 'r') as file:
+            return json.load(file)
+    except (FileNotFoundError, JSONDecodeError):
+        return {}
+
+def _get_source_cursors() -> dict[str, str]:
+    # Cursors written before the state store still count until the first
+    # write moves them over.
+    cursors = state.get(CURSORS_KEY)
+    return cursors if cursors is not None else _get_legacy_source_cursors()
+
+def set_last_checked(timestamp: dt, sources: Iterable[str]) -> None:
+    def advance(cursors: dict[str, str] | None) -> dict[str, str]:
+        cursors = cursors if cursors is not None else _get_legacy_source_cursors()
+        return {**cursors, **{source: timestamp.isoformat() for source in sources}}
+
+    state.update(CURSORS_KEY, advance)
+
+def get_last_checked(source: str) -> dt | None:
+    cursor = _get_source_cursors().get(source)
+    if cursor:
+        return dt.fromisoformat(cursor)
+
+    # Before sources were configurable, the original author's cursor lived in
+    # its own file.
+    if source == DEFAULT_SOURCE.name:
+        return _get_legacy_last_checked()
+
+    return None
+
 def verify_token(request: Request) -> bool:
     auth_header = request.headers.get('Authorization')
     if not auth_header:
@@ -0,0 +1,58 @@
+import logging
+import os
+import random
+import signal
+import threading
+import time
+
+from cozymeal import locks, settings, store as czs
+
+logger = logging.getLogger(__name__)
+
+def _next_delay() -> float:
+    # Jitter keeps restarted workers from lining their crawls up.
+    return settings.CRAWL_INTERVAL + random.uniform(0, settings.CRAWL_JITTER)
+
+def _refresh_if_older_than(timestamp: float) -> bool:
+    with locks.file_lock(settings.REFRESH_LOCK_FILENAME):
+        # Whoever held the lock before us may have just done the crawl.
+        refreshed_at = czs.get_refreshed_at()
+        if refreshed_at is not None and refreshed_at >= timestamp:
+            return False
+        czs.refresh_articles()
+        return True
+
+def refresh(max_age: float = 0) -> bool:
+    return _refresh_if_older_than(time.time() - max_age)
+
+def crawl_if_due() -> bool:
+    try:
+        return refresh(max_age=settings.CRAWL_INTERVAL)
+    except Exception:
+        logger.exception("Background crawl failed")
+        return False
+
+def run(stop: threading.Event) -> None:
+    # Whoever holds the worker lock is the leader and does all the crawling.
+    # Everyone else keeps trying for it in case the leader goes away.
+    while not stop.is_set():
+        with locks.file_lock(settings.WORKER_LOCK_FILENAME, blocking=False) as leader:
+            if leader:
+                logger.info("Crawl worker %d is the leader", os.getpid())
+                while not stop.is_set():
+                    crawl_if_due()
+                    stop.wait(_next_delay())
+
+        stop.wait(_next_delay())
+
+def main() -> None:
+    logging.basicConfig(level=settings.LOG_LEVEL, format="%(message)s")
+    settings.init()
+    stop = threading.Event()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(signum, lambda *_: stop.set())
+
+    run(stop)
+
+if __name__ == "__main__":
+    main()
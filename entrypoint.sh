@@ -3,6 +3,10 @@
 echo "Loading environment variables for cron..."
 env > /etc/environment
 
+# Metrics snapshots are named after PIDs, which this boot may hand out again.
+echo "Clearing metrics from the last run..."
+rm -rf "$(python -c 'from cozymeal import settings; print(settings.METRICS_DIR)')"
+
 # Start cron
 echo "Starting cron service..."
 cron
@@ -14,6 +18,12 @@ cleanup() {
     echo "Stopping cron service..."
     pkill cron
 
+    if [ -n "$worker" ]; then
+        echo "Stopping crawl worker..."
+        kill -TERM "$worker"
+        wait "$worker"
+    fi
+
     if [ -n "$child" ]; then
         echo "Stopping gunicorn gracefully..."
         kill -TERM "$child"
@@ -27,17 +37,43 @@ cleanup() {
 # Set up signal handlers for graceful shutdown
 trap cleanup 15 2
 
+# Start the crawl worker, which keeps the article store up to date on its
+# own schedule so that requests never have to crawl.
+start_worker() {
+    echo "Starting crawl worker..."
+    python -m cozymeal.worker &
+    worker=$!
+}
+start_worker
+
 # Start gunicorn in the background and capture its PID
 echo "Starting gunicorn server..."
-gunicorn --bind 0.0.0.0:5000 --workers 2 app:app &
+gunicorn --config gunicorn.conf.py app:app &
 child=$!
 
 # Log the main processes
 echo "Entrypoint setup complete:"
 echo "- Cron service running"
+echo "- Crawl worker running with PID: $worker"
 echo "- Gunicorn running with PID: $child"
 
 # Keep the container running
 echo "Container is now running. Use docker stop to terminate properly."
 tail -f /var/log/cron.log &
+
+# Without the worker the store stops being refreshed, so it is restarted
+# whenever it exits for as long as gunicorn runs. Sleeping in the background
+# lets the signal handlers run without waiting for the sleep to end.
+while kill -0 "$child" 2>/dev/null; do
+    if ! kill -0 "$worker" 2>/dev/null; then
+        wait "$worker"
+        echo "Crawl worker exited with status $?, restarting it"
+        start_worker
+    fi
+    sleep 5 &
+    wait $!
+done
+
+echo "Gunicorn exited, stopping the container"
+kill -TERM "$worker" 2>/dev/null
 wait "$child"
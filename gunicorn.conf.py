@@ -0,0 +1,10 @@
+from cozymeal import settings
+
+# Requests spend most of their time waiting on SQLite, the state files or a
+# slow client, so each worker serves them on a pool of threads rather than
+# one at a time. Everything shared between a worker's threads is either
+# locked or opened per call.
+bind = "0.0.0.0:5000"
+worker_class = "gthread"
+workers = settings.WEB_WORKERS
+threads = settings.WEB_THREADS
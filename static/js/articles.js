@@ -21,7 +21,19 @@ async function displayArticles(articles) {
     });
 }
 
-fetch("/articles")
-    .then(response => response.json())
-    .then(data => displayArticles(data))
-    .catch(error => console.error("Error fetching articles:", error));
\ No newline at end of file
+// Until the first crawl has finished the server answers 503 with a
+// Retry-After, so keep asking until the articles are in.
+function loadArticles() {
+    fetch("/articles")
+        .then(response => {
+            if (response.status === 503) {
+                const retryAfter = Number(response.headers.get("Retry-After")) || 5;
+                setTimeout(loadArticles, retryAfter * 1000);
+                return;
+            }
+            return response.json().then(data => displayArticles(data));
+        })
+        .catch(error => console.error("Error fetching articles:", error));
+}
+
+loadArticles();
\ No newline at end of file
@@ -0,0 +1,207 @@
+import hashlib
+import json
+import pytest
+import threading
+import time
+
+from datetime import datetime as dt, timedelta as tdelta, timezone
+from pathlib import Path
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pytest import MonkeyPatch
+from typing import Any, Callable, Generator
+from urllib.parse import parse_qs, urlparse
+from cozymeal.search import SearchIndex
+from cozymeal.sources import DEFAULT_SOURCE, Source
+
+@pytest.fixture(autouse=True)
+def data_dir(monkeypatch: MonkeyPatch, tmp_path: Path) -> Path:
+    """Keep everything the app persists inside a per-test directory."""
+
+    monkeypatch.setattr("cozymeal.settings.LAST_CHECKED_DIR", tmp_path)
+    monkeypatch.setattr("cozymeal.settings.LAST_CHECKED_FILENAME", tmp_path / "last_checked_time.json")
+    monkeypatch.setattr("cozymeal.settings.STORE_FILENAME", tmp_path / "articles.sqlite3")
+    monkeypatch.setattr("cozymeal.settings.REFRESH_LOCK_FILENAME", tmp_path / "refresh.lock")
+    monkeypatch.setattr("cozymeal.settings.WORKER_LOCK_FILENAME", tmp_path / "worker.lock")
+    monkeypatch.setattr("cozymeal.settings.STATE_DIR", tmp_path / "state")
+    monkeypatch.setattr("cozymeal.settings.DIGEST_LOCK_FILENAME", tmp_path / "digest.lock")
+    monkeypatch.setattr("cozymeal.settings.PAGE_CACHE_FILENAME", tmp_path / "page_cache.sqlite3")
+    monkeypatch.setattr("cozymeal.settings.LAST_CHECKED_SOURCES_FILENAME", tmp_path / "last_checked_sources.json")
+    monkeypatch.setattr("cozymeal.settings.SOURCES_FILENAME", tmp_path / "sources.json")
+    monkeypatch.setattr("cozymeal.settings.SUBSCRIBERS_FILENAME", tmp_path / "subscribers.json")
+    monkeypatch.setattr("cozymeal.settings.METRICS_DIR", tmp_path / "metrics")
+    monkeypatch.setattr("cozymeal.metrics._histograms", {})
+    monkeypatch.setattr("cozymeal.metrics._counters", {})
+    monkeypatch.setattr("cozymeal.metrics._dirty", False)
+    monkeypatch.setattr("cozymeal.metrics._flush_timer", None)
+    monkeypatch.setattr("cozymeal.metrics._last_flush", 0.0)
+    monkeypatch.setattr("cozymeal.search._index", SearchIndex())
+    monkeypatch.setattr("cozymeal.feed._feed", None)
+    monkeypatch.setattr("cozymeal.settings.OUTBOX_FILENAME", tmp_path / "outbox.sqlite3")
+    monkeypatch.setattr("cozymeal.settings.OUTBOX_LOCK_FILENAME", tmp_path / "outbox.lock")
+    return tmp_path
+
+@pytest.fixture(autouse=True)
+def no_outbox_sender(monkeypatch: MonkeyPatch) -> None:
+    """Keep the background sender from starting; tests drain the outbox themselves."""
+
+    monkeypatch.setattr("cozymeal.outbox.start_sender", lambda: None)
+
+@pytest.fixture(autouse=True)
+def fetch_session(monkeypatch: MonkeyPatch) -> None:
+    """Give each test a fresh, unthrottled HTTP session with quick retries."""
+
+    monkeypatch.setattr("cozymeal.fetch._session", None)
+    monkeypatch.setattr("cozymeal.fetch._limiters", {})
+    monkeypatch.setattr("cozymeal.settings.MAX_REQUESTS_PER_SECOND", 0)
+    monkeypatch.setattr("cozymeal.settings.FETCH_BACKOFF", 0)
+    monkeypatch.setattr("cozymeal.settings.FETCH_RETRIES", 2)
+
+ARCHIVE_START_DATE = dt(2025, 1, 1, tzinfo=timezone.utc)
+
+def render_archive_page(page: int, articles_per_page: int = 2, slug: str = "sarah-salisbury") -> str:
+    """Render an archive page whose articles get older with every page."""
+
+    scripts = []
+    for i in range(articles_per_page):
+        index = (page - 1) * articles_per_page + i
+        script_data = {
+            "@context": "https://schema.org",
+            "@type": "Article",
+            "mainEntityOfPage": {
+                "@type": "WebPage",
+                "@id": f"https://www.cozymeal.com/magazine/{slug}/article-{index}",
+            },
+            "name": f"Article {index}",
+            "author": {
+                "@type": "Person",
+                "name": "Sarah Salisbury",
+            },
+            "datePublished": (ARCHIVE_START_DATE - tdelta(days=index)).isoformat(),
+        }
+        scripts.append(f'<script type="application/ld+json">{json.dumps(script_data)}</script>')
+
+    return f"<html><head></head><body>{''.join(scripts)}</body></html>"
+
+class ArchiveServer(ThreadingHTTPServer):
+    """Local stand-in for the author archive, serving `pages` pages and 404 after that.
+
+    `failures` maps a page number to how many times it answers `failure_status`
+    before succeeding.
+    With `max_in_flight`, requests beyond that many at once are answered 429,
+    with `retry_after` as the Retry-After header if given. `peak_in_flight`
+    is the most requests it has had in flight at once.
+    """
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        pages: int,
+        latency: float = 0.0,
+        etags: bool = False,
+        failures: dict[int, int] | None = None,
+        failure_status: int = 503,
+        slug: str = "sarah-salisbury",
+        max_in_flight: int | None = None,
+        retry_after: str | None = None,
+    ):
+        super().__init__(("127.0.0.1", 0), ArchiveRequestHandler)
+        self.slug = slug
+        self.pages = pages
+        self.latency = latency
+        self.etags = etags
+        self.failures = dict(failures or {})
+        self.failure_status = failure_status
+        self.max_in_flight = max_in_flight
+        self.retry_after = retry_after
+        self.requested_pages = []
+        self.request_times = []
+        self.throttled_at = []
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/magazine/authors/{self.slug}"
+
+class ArchiveRequestHandler(BaseHTTPRequestHandler):
+    server: ArchiveServer
+
+    def do_GET(self) -> None:
+        query = parse_qs(urlparse(self.path).query)
+        page = int(query.get("page", ["1"])[0])
+        with self.server.lock:
+            self.server.requested_pages.append(page)
+            self.server.request_times.append(time.monotonic())
+            self.server.in_flight += 1
+            self.server.peak_in_flight = max(self.server.peak_in_flight, self.server.in_flight)
+            throttled = self.server.max_in_flight is not None and self.server.in_flight > self.server.max_in_flight
+
+        # A request stops counting once its work is done rather than once the
+        # response is out, so the client's next request can't race it.
+        try:
+            time.sleep(self.server.latency)
+        finally:
+            with self.server.lock:
+                self.server.in_flight -= 1
+
+        if throttled:
+            with self.server.lock:
+                self.server.throttled_at.append(time.monotonic())
+            self.send_response(429)
+            if self.server.retry_after is not None:
+                self.send_header("Retry-After", self.server.retry_after)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        if page > self.server.pages:
+            self.send_error(404)
+            return
+
+        if self.server.failures.get(page, 0) > 0:
+            self.server.failures[page] -= 1
+            self.send_error(self.server.failure_status)
+            return
+
+        body = render_archive_page(page, slug=self.server.slug).encode()
+        etag = f'"{hashlib.sha1(body).hexdigest()}"'
+        if self.server.etags and self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+
+        self.send_response(200)
+        if self.server.etags:
+            self.send_header("ETag", etag)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args: Any) -> None:
+        pass
+
+@pytest.fixture
+def archive_server(monkeypatch: MonkeyPatch) -> Generator[Callable[..., ArchiveServer], Any, None]:
+    """Start a local archive server and point the scraper at it."""
+
+    servers = []
+
+    def start(pages: int, **kwargs: Any) -> ArchiveServer:
+        server = ArchiveServer(pages, **kwargs)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+
+        # The first server started stands in for the default source.
+        if len(servers) == 1:
+            monkeypatch.setattr("cozymeal.sources.DEFAULT_SOURCE", Source(DEFAULT_SOURCE.name, server.url, DEFAULT_SOURCE.author))
+        return server
+
+    yield start
+
+    for server in servers:
+        server.shutdown()
+        server.server_close()
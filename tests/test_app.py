@@ -1,4 +1,5 @@
 import pytest
+import time
 
 from app import app as flask_app
 from contextlib import contextmanager
@@ -7,20 +8,28 @@ from flask import Flask, template_rendered
 from flask.testing import FlaskClient
 from pytest import MonkeyPatch
 from typing import Any, Generator
-from cozymeal import settings
+from xml.etree import ElementTree
+from cozymeal import feed, settings, store
+from cozymeal.articles import Article
+from cozymeal.sources import DEFAULT_SOURCE, Source
+from datetime import timedelta as tdelta
 
 VALID_TOKEN = 'valid_token'
 INITIAL_TIME = dt(2023, 1, 1, tzinfo=settings.DEFAULT_TZ)
+REFRESHED_AT = dt(2023, 1, 2, tzinfo=settings.DEFAULT_TZ)
 
 @pytest.fixture
 def mock_cozymeal(monkeypatch: MonkeyPatch) -> None:
     """Set up common mocking behavior for cozymeal tests."""
 
     monkeypatch.setattr('cozymeal.settings.API_TOKEN', VALID_TOKEN)
-    monkeypatch.setattr('cozymeal.articles.get_new_articles', lambda _: ["spoof_article"])
-    monkeypatch.setattr('cozymeal.emails.send_email_for_articles', lambda _: None)
-    monkeypatch.setattr('cozymeal.utils.get_last_checked', lambda: INITIAL_TIME)
-    monkeypatch.setattr('cozymeal.utils.set_last_checked', lambda _: None)
+    monkeypatch.setattr('cozymeal.store.get_refreshed_at', lambda: REFRESHED_AT.timestamp())
+    monkeypatch.setattr('cozymeal.store.get_source_refreshed_at', lambda: {DEFAULT_SOURCE.name: REFRESHED_AT.timestamp()})
+    monkeypatch.setattr('cozymeal.store.get_new_articles', lambda _: ["spoof_article"])
+    monkeypatch.setattr('cozymeal.outbox.enqueue', lambda _: [1])
+    monkeypatch.setattr('cozymeal.utils.get_last_checked', lambda _: INITIAL_TIME)
+    monkeypatch.setattr('cozymeal.utils.set_last_checked', lambda *_: None)
+    monkeypatch.setattr('cozymeal.outbox.get_unsent_articles', lambda articles: articles)
 
 @contextmanager
 def captured_templates(app: Flask):
@@ -37,6 +46,12 @@ def captured_templates(app: Flask):
     finally:
         template_rendered.disconnect(record, app)
 
+@pytest.fixture
+def crawled() -> None:
+    """Record a finished crawl, as the worker would."""
+
+    store.set_meta(store.REFRESHED_AT_KEY, str(time.time()))
+
 @pytest.fixture
 def app() -> Generator[Flask, Any, None]:
     """Create and configure a Flask app for testing."""
@@ -69,6 +84,35 @@ def test_home_page(client: FlaskClient, app: Flask) -> None:
         # Additional checks for expected context variables
         assert 'last_checked' in context
 
+        # Nothing has been crawled yet, so the page's script fetches the list.
+        assert context['articles'] is None
+        assert b'Loading...' in response.data
+        assert b'js/articles.js' in response.data
+
+def test_home_page_renders_stored_articles(client: FlaskClient, crawled) -> None:
+    """Test that the home page lists stored articles itself, without the script."""
+
+    now = dt.now(settings.DEFAULT_TZ)
+    store.merge_articles([
+        Article("Fish &amp; Chips", "https://example.com/1", now),
+        Article("Too Old", "https://example.com/2", now - tdelta(days=8)),
+    ])
+
+    response = client.get('/')
+
+    assert response.status_code == 200
+    assert b'<a class="article-title" href="https://example.com/1">Fish &amp; Chips</a>' in response.data
+    assert b'Too Old' not in response.data
+    assert b'js/articles.js' not in response.data
+
+def test_home_page_no_new_articles(client: FlaskClient, crawled) -> None:
+    """Test the home page once the store is filled but holds nothing from this week."""
+
+    response = client.get('/')
+
+    assert b'No new articles!' in response.data
+    assert b'js/articles.js' not in response.data
+
 def test_post_without_auth(client: FlaskClient) -> None:
     """Test POST request with no credentials."""
 
@@ -92,7 +136,7 @@ def test_post_with_invalid_auth(client: FlaskClient, mock_cozymeal, monkeypatch:
     updated_time = False
 
     # Mock function to track if set_last_checked was called
-    def mock_set_last_checked(_):
+    def mock_set_last_checked(*_):
         nonlocal updated_time
         updated_time = True
 
@@ -114,9 +158,9 @@ def test_post_with_valid_auth(client: FlaskClient, mock_cozymeal, monkeypatch: M
     updated_time = False
 
     # Mock function to track if set_last_checked was called with a newer timestamp
-    def mock_set_last_checked(timestamp: dt) -> bool:
+    def mock_set_last_checked(timestamp: dt, sources: list[str]) -> bool:
         nonlocal updated_time
-        assert timestamp > INITIAL_TIME
+        assert timestamp == REFRESHED_AT
         updated_time = True
 
     # Override only the set_last_checked function
@@ -129,7 +173,7 @@ def test_post_with_valid_auth(client: FlaskClient, mock_cozymeal, monkeypatch: M
     response = client.post("/", headers=headers)
 
     # Verify response and that last_checked was updated
-    assert response.status_code == 200
+    assert response.status_code == 202
     assert updated_time is True
 
 def test_post_with_valid_auth_no_articles(client: FlaskClient, mock_cozymeal, monkeypatch: MonkeyPatch) -> None:
@@ -137,13 +181,13 @@ def test_post_with_valid_auth_no_articles(client: FlaskClient, mock_cozymeal, mo
 
     updated_time = False
 
-    def mock_set_last_checked(timestamp: dt) -> bool:
+    def mock_set_last_checked(timestamp: dt, sources: list[str]) -> bool:
         nonlocal updated_time
         assert timestamp > INITIAL_TIME
         updated_time = True
 
     # Override the default mock to return empty articles list
-    monkeypatch.setattr('cozymeal.articles.get_new_articles', lambda _: [])
+    monkeypatch.setattr('cozymeal.store.get_new_articles', lambda _: [])
     monkeypatch.setattr('cozymeal.utils.set_last_checked', mock_set_last_checked)
 
     headers = {
@@ -157,17 +201,270 @@ def test_post_with_valid_auth_no_articles(client: FlaskClient, mock_cozymeal, mo
 def test_last_checked_none(client: FlaskClient, mock_cozymeal, monkeypatch: MonkeyPatch) -> None:
     """Test POST request with valid credentials but no previous last_checked value."""
 
-    def mock_get_new_articles(last_checked: dt) -> list:
-        assert last_checked == INITIAL_TIME
+    def mock_get_new_articles(cursors: dict[str, dt]) -> list:
+        assert cursors == {DEFAULT_SOURCE.name: INITIAL_TIME}
         return ["spoof_article"]
 
-    monkeypatch.setattr('cozymeal.utils.get_last_checked', lambda: None)
+    monkeypatch.setattr('cozymeal.utils.get_last_checked', lambda _: None)
     monkeypatch.setattr('cozymeal.utils.get_date_a_week_ago', lambda: INITIAL_TIME)
-    monkeypatch.setattr('cozymeal.articles.get_new_articles', mock_get_new_articles)
+    monkeypatch.setattr('cozymeal.store.get_new_articles', mock_get_new_articles)
+
+    headers = {
+        "Authorization": f"Bearer {VALID_TOKEN}"
+    }
+    response = client.post("/", headers=headers)
+
+    assert response.status_code == 202
+
+def test_post_queues_before_updating_last_checked(client: FlaskClient, mock_cozymeal, monkeypatch: MonkeyPatch) -> None:
+    """Test that last_checked only moves once the digest is safely queued."""
+
+    calls = []
+    monkeypatch.setattr('cozymeal.outbox.enqueue', lambda articles: calls.append(('enqueue', articles)))
+    monkeypatch.setattr('cozymeal.utils.set_last_checked', lambda *_: calls.append(('set_last_checked',)))
 
     headers = {
         "Authorization": f"Bearer {VALID_TOKEN}"
     }
     response = client.post("/", headers=headers)
 
-    assert response.status_code == 200
\ No newline at end of file
+    assert response.status_code == 202
+    assert calls == [('enqueue', ["spoof_article"]), ('set_last_checked',)]
+
+def test_post_only_moves_cursors_of_crawled_sources(client: FlaskClient, mock_cozymeal, monkeypatch: MonkeyPatch) -> None:
+    """Test that a source whose crawls keep failing keeps its cursor while the others move on."""
+
+    calls = []
+    monkeypatch.setattr('cozymeal.sources.load_sources', lambda: [Source("healthy", "https://example.com/a"), Source("broken", "https://example.com/b")])
+    monkeypatch.setattr('cozymeal.store.get_source_refreshed_at', lambda: {"healthy": REFRESHED_AT.timestamp()})
+    monkeypatch.setattr('cozymeal.utils.set_last_checked', lambda timestamp, sources: calls.append((timestamp, sources)))
+
+    headers = {
+        "Authorization": f"Bearer {VALID_TOKEN}"
+    }
+    response = client.post("/", headers=headers)
+
+    assert response.status_code == 202
+    assert calls == [(REFRESHED_AT, ["healthy"])]
+
+def test_post_before_first_crawl(client: FlaskClient, mock_cozymeal, monkeypatch: MonkeyPatch) -> None:
+    """Test that no digest is sent and no cursor moves before the worker has crawled."""
+
+    monkeypatch.setattr('cozymeal.store.get_refreshed_at', lambda: None)
+    monkeypatch.setattr('cozymeal.store.get_new_articles', lambda _: pytest.fail("store queried"))
+
+    headers = {
+        "Authorization": f"Bearer {VALID_TOKEN}"
+    }
+    response = client.post("/", headers=headers)
+
+    assert response.status_code == 503
+    assert response.headers['Retry-After']
+
+def test_articles_before_first_crawl(client: FlaskClient) -> None:
+    """Test that /articles asks clients to come back while the first crawl runs."""
+
+    response = client.get('/articles')
+
+    assert response.status_code == 503
+    assert response.headers['Retry-After']
+
+def test_metrics(client: FlaskClient) -> None:
+    """Test that request timings are exposed in Prometheus format."""
+
+    client.get('/')
+    response = client.get('/metrics')
+
+    assert response.status_code == 200
+    assert response.mimetype == 'text/plain'
+    assert 'cozymeal_stage_duration_seconds_count{stage="render_home_page"} 1' in response.text
+
+@pytest.mark.parametrize("count", [0, 1, 250])
+def test_articles_returns_json_array(client: FlaskClient, crawled, count: int) -> None:
+    """Test that /articles returns this week's articles as one JSON array, newest first."""
+
+    now = dt.now(settings.DEFAULT_TZ)
+    store.merge_articles([
+        Article(f"Article &amp; {i}", f"https://example.com/{i}", now - tdelta(minutes=i))
+        for i in range(count)
+    ])
+    store.merge_articles([Article("Old", "https://example.com/old", now - tdelta(days=8))])
+
+    response = client.get('/articles?limit=250')
+
+    assert response.mimetype == 'application/json'
+    assert response.json == [
+        {"title": f"Article & {i}", "url": f"https://example.com/{i}", "date_published": (now - tdelta(minutes=i)).strftime("%m/%d/%Y")}
+        for i in range(count)
+    ]
+
+@pytest.fixture
+def stored_articles(crawled) -> list[Article]:
+    """Fill the store with a few days of articles from two sources, newest first."""
+
+    now = dt.now(settings.DEFAULT_TZ)
+    articles_list = [
+        Article(f"Recipe &amp; Story {i}", f"https://example.com/{i}", now - tdelta(hours=i), "first" if i % 2 else "second")
+        for i in range(10)
+    ]
+    store.merge_articles(articles_list)
+    return articles_list
+
+def test_articles_paginates_with_link_header(client: FlaskClient, stored_articles: list[Article]) -> None:
+    """Test that following the Link header walks every article exactly once."""
+
+    urls = []
+    next_url = '/articles?limit=3'
+    while next_url:
+        response = client.get(next_url)
+        assert response.status_code == 200
+        urls.extend(article["url"] for article in response.json)
+
+        link = response.headers.get('Link')
+        next_url = link[1:link.index('>')] if link else None
+
+    assert urls == [a.url for a in stored_articles]
+
+def test_articles_filters(client: FlaskClient, stored_articles: list[Article]) -> None:
+    """Test the since, until, source and title search parameters."""
+
+    since = (stored_articles[5].date_published).isoformat()
+    until = (stored_articles[1].date_published).isoformat()
+
+    response = client.get('/articles', query_string={"since": since, "until": until, "source": "first"})
+    assert [a["url"] for a in response.json] == [stored_articles[i].url for i in (3, 5)]
+
+    response = client.get('/articles', query_string={"q": "& STORY 7"})
+    assert [a["title"] for a in response.json] == ["Recipe & Story 7"]
+
+def test_articles_search_pages_within_filters(client: FlaskClient, stored_articles: list[Article]) -> None:
+    """Test that q matches words like /search and pages through the other filters' results."""
+
+    urls = []
+    next_url = '/articles?q=sto&source=first&limit=2'
+    while next_url:
+        response = client.get(next_url)
+        urls.extend(article["url"] for article in response.json)
+
+        link = response.headers.get('Link')
+        next_url = link[1:link.index('>')] if link else None
+
+    assert urls == [a.url for a in stored_articles if a.source == "first"]
+    assert client.get('/articles?q=tory').json == []
+
+@pytest.mark.parametrize("query_string", ["since=yesterday", "since=0001-01-01", "until=9999-12-31", "limit=0", "limit=x", "cursor=!!"])
+def test_articles_rejects_bad_parameters(client: FlaskClient, stored_articles: list[Article], query_string: str) -> None:
+    """Test that malformed parameters are a 400 rather than a server error."""
+
+    response = client.get(f'/articles?{query_string}')
+
+    assert response.status_code == 400
+    assert "error" in response.json
+
+def test_articles_conditional_requests(client: FlaskClient, stored_articles: list[Article]) -> None:
+    """Test that unchanged articles are a 304 and a store change invalidates the ETag."""
+
+    response = client.get('/articles')
+    assert len(response.json) == 10
+    etag = response.headers['ETag']
+    assert response.headers['Cache-Control'] == f'public, max-age={settings.ARTICLES_MAX_AGE}'
+    assert response.last_modified is not None
+
+    assert client.get('/articles', headers={'If-None-Match': etag}).status_code == 304
+    assert client.get('/articles', headers={'If-Modified-Since': response.headers['Last-Modified']}).status_code == 304
+
+    store.merge_articles([Article("Renamed", stored_articles[0].url, stored_articles[0].date_published, "second")])
+
+    response = client.get('/articles', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+    assert response.json[0]["title"] == "Renamed"
+
+def test_search_finds_stored_articles(client: FlaskClient, stored_articles: list[Article]) -> None:
+    """Test that search matches word prefixes in displayed titles, newest first."""
+
+    response = client.get('/search?q=sto&limit=2')
+
+    assert response.status_code == 200
+    assert response.json == [
+        {"title": a.get_pretty_title(), "url": a.url, "date_published": a.get_pretty_date()}
+        for a in stored_articles[:2]
+    ]
+    assert client.get('/search?q=recipe+story+9').json[0]["url"] == stored_articles[9].url
+    assert client.get('/search?q=amp').json == []
+
+@pytest.mark.parametrize("query", ["", "q=", "q=%21%21", "q=fish&limit=0", "q=fish&limit=ten"])
+def test_search_rejects_bad_parameters(client: FlaskClient, crawled, query: str) -> None:
+    """Test that a query without words or a bad limit is a client error."""
+
+    assert client.get(f'/search?{query}').status_code == 400
+
+def test_search_before_first_crawl(client: FlaskClient) -> None:
+    """Test that search asks clients to come back until the first crawl is in."""
+
+    response = client.get('/search?q=fish')
+
+    assert response.status_code == 503
+    assert response.headers['Retry-After']
+
+ATOM = '{http://www.w3.org/2005/Atom}'
+
+def test_feed_lists_newest_articles(client: FlaskClient, stored_articles: list[Article]) -> None:
+    """Test that the Atom feed holds the stored articles, newest first, with a strong ETag."""
+
+    response = client.get('/feed.xml')
+
+    assert response.status_code == 200
+    assert response.mimetype == 'application/atom+xml'
+    assert not response.headers['ETag'].startswith('W/')
+    assert response.last_modified is not None
+
+    feed = ElementTree.fromstring(response.data)
+    assert feed.find(f'{ATOM}id').text == 'http://localhost/feed.xml'
+    entries = feed.findall(f'{ATOM}entry')
+    assert [e.find(f'{ATOM}title').text for e in entries] == [a.get_pretty_title() for a in stored_articles]
+    assert [e.find(f'{ATOM}link').get('href') for e in entries] == [a.url for a in stored_articles]
+    assert entries[0].find(f'{ATOM}category').get('term') == stored_articles[0].source
+
+def test_feed_conditional_get(client: FlaskClient, stored_articles: list[Article]) -> None:
+    """Test that a reader polling with either validator gets an empty 304."""
+
+    response = client.get('/feed.xml')
+
+    for headers in (
+        {'If-None-Match': response.headers['ETag']},
+        {'If-Modified-Since': response.headers['Last-Modified']},
+    ):
+        not_modified = client.get('/feed.xml', headers=headers)
+        assert not_modified.status_code == 304
+        assert not_modified.data == b''
+        assert not_modified.headers['ETag'] == response.headers['ETag']
+
+def test_feed_rebuilt_only_when_articles_change(client: FlaskClient, stored_articles: list[Article], monkeypatch: MonkeyPatch) -> None:
+    """Test that the feed is rendered once per change to the articles, however often it's polled."""
+
+    monkeypatch.setattr('cozymeal.settings.FEED_CHECK_INTERVAL', 0)
+    renders = []
+    render = feed._render
+    monkeypatch.setattr('cozymeal.feed._render', lambda *args: renders.append(args) or render(*args))
+
+    first = client.get('/feed.xml')
+    client.get('/feed.xml')
+    assert len(renders) == 1
+
+    new_article = Article('Brand New', 'https://example.com/new', dt.now(settings.DEFAULT_TZ))
+    store.merge_articles([new_article])
+    second = client.get('/feed.xml', headers={'If-None-Match': first.headers['ETag']})
+
+    assert len(renders) == 2
+    assert second.status_code == 200
+    assert second.headers['ETag'] != first.headers['ETag']
+    assert ElementTree.fromstring(second.data).find(f'{ATOM}entry/{ATOM}title').text == 'Brand New'
+
+def test_feed_before_first_crawl(client: FlaskClient) -> None:
+    """Test that the feed asks readers to come back until the first crawl is in."""
+
+    response = client.get('/feed.xml')
+
+    assert response.status_code == 503
+    assert response.headers['Retry-After']
@@ -2,12 +2,16 @@ import pytest
 
 from bs4 import BeautifulSoup
 from datetime import datetime as dt, timedelta as tdelta
-from cozymeal import articles, settings
+from cozymeal import articles, fetch, settings
 from cozymeal.articles import Article
-from json import JSONDecodeError
+from cozymeal.sources import DEFAULT_SOURCE, Source
+from pathlib import Path
 from pytest import MonkeyPatch
+from tests.conftest import ArchiveServer
+from typing import Callable
 from requests import Response
-from requests.exceptions import ConnectionError, HTTPError
+from requests.exceptions import ConnectionError, HTTPError, RequestException
+from urllib.parse import urlparse
 
 TEST_TITLE = "Fish &amp; Chips"
 TEST_PRETTY_TITLE = "Fish & Chips"
@@ -32,6 +36,41 @@ def test_get_pretty_title(mock_article: Article) -> None:
     """Test unescaping of title variable."""
     assert mock_article.get_pretty_title() == TEST_PRETTY_TITLE
 
+def test_article_equality_by_url(mock_article: Article) -> None:
+    """Test that articles are equal and hash alike when they share a URL."""
+    duplicate = Article("Other title", TEST_URL, TEST_DATE_PUBLISHED + tdelta(days=1))
+
+    assert mock_article == duplicate
+    assert mock_article != Article(TEST_TITLE, TEST_URL + "/other", TEST_DATE_PUBLISHED)
+    assert len({mock_article, duplicate}) == 1
+
+def test_article_has_no_dict(mock_article: Article) -> None:
+    """Test that articles are slotted rather than carrying a __dict__."""
+    assert not hasattr(mock_article, "__dict__")
+
+def test_pretty_fields_are_memoized(mock_article: Article, monkeypatch: MonkeyPatch) -> None:
+    """Test that the unescaped title is only computed once per article."""
+    calls = []
+    monkeypatch.setattr("cozymeal.articles.unescape", lambda s: calls.append(s) or s)
+
+    mock_article.get_pretty_title()
+    mock_article.get_pretty_title()
+
+    assert len(calls) == 1
+
+@pytest.mark.parametrize("test_article", [
+    Article(TEST_TITLE, TEST_URL, TEST_DATE_PUBLISHED),
+    Article("Crème brûlée 🍮", TEST_URL, dt.fromisoformat("2024-03-05T07:08:09.123456-05:30"), "sarah-salisbury"),
+    Article("", TEST_URL, dt(2024, 3, 5, 7, 8, 9)),
+])
+def test_article_bytes_round_trip(test_article: Article) -> None:
+    """Test that articles survive the binary form unchanged, including naive dates."""
+    packed = articles.pack_articles([test_article, test_article])
+    unpacked = articles.unpack_articles(packed)
+
+    assert [a.to_dict() for a in unpacked] == [test_article.to_dict()] * 2
+    assert unpacked[0].date_published.utcoffset() == test_article.date_published.utcoffset()
+
 def test_get_pretty_date(mock_article: Article) -> None:
     """Test formatting of datetime objects."""
     assert mock_article.get_pretty_date() == TEST_PRETTY_DATE
@@ -63,6 +102,7 @@ def test_get_article_from_script_valid_data() -> None:
     assert article.title == TEST_TITLE
     assert article.url == TEST_URL
     assert article.date_published == TEST_DATE_PUBLISHED
+    assert article.date_modified == dt.fromisoformat("2025-04-01T16:03:01-07:00")
 
 def test_get_article_from_script_missing_fields() -> None:
     """Test data extraction from script tag with missing fields."""
@@ -113,8 +153,8 @@ def test_get_date_published_malformed_data() -> None:
     soup = BeautifulSoup(test_script_raw, "html.parser")
     test_script = soup.script
 
-    with pytest.raises(JSONDecodeError):
-        articles._get_article_from_script(test_script)
+    # Malformed JSON is skipped like any other script that isn't an article.
+    assert articles._get_article_from_script(test_script) is None
 
     # Script with malformed date (incorrect format).
     test_script_raw = f"""\
@@ -158,6 +198,11 @@ def test_get_date_published_invalid_date() -> None:
     with pytest.raises(ValueError):
         articles._get_date_published(script_data)
 
+@pytest.mark.parametrize("script_data", [{}, {"dateModified": None}, {"dateModified": "yesterday"}])
+def test_get_date_modified_optional(script_data: dict) -> None:
+    """Test that a missing or malformed dateModified is simply left out."""
+    assert articles._get_date_modified(script_data) is None
+
 def test_get_articles_from_archive_page_success(monkeypatch: MonkeyPatch) -> None:
     """Test extraction of articles from archive pages."""
 
@@ -188,18 +233,20 @@ def test_get_articles_from_archive_page_success(monkeypatch: MonkeyPatch) -> Non
     </html>
     """
 
-    # Class to patch requests.get.
+    # Class to patch fetch.get.
     class MockResponse:
         def __init__(self):
+            self.status_code = 200
+            self.headers = {}
             self.text = test_html
 
         def raise_for_status(self) -> None:
             pass
 
-    def mock_requests_get(_) -> None:
+    def mock_fetch_get(url: str, **kwargs) -> None:
         return MockResponse()
 
-    monkeypatch.setattr('requests.get', mock_requests_get)
+    monkeypatch.setattr('cozymeal.fetch.get', mock_fetch_get)
 
     # Check that the function extracts the single article.
     page_of_articles = articles._get_articles_from_archive_page(1)
@@ -214,17 +261,19 @@ def test_get_articles_from_archive_page_success(monkeypatch: MonkeyPatch) -> Non
 def test_get_article_from_archive_page_404(monkeypatch: MonkeyPatch) -> None:
     """Test response if archive page returns 404."""
 
-    # Class to patch requests.get.
+    # Class to patch fetch.get.
     class MockResponse:
+        status_code = 404
+
         def raise_for_status(self) -> None:
             response = Response()
             response.status_code = 404
             raise HTTPError(response=response)
 
-    def mock_requests_get(_) -> None:
+    def mock_fetch_get(url: str, **kwargs) -> None:
         return MockResponse()
 
-    monkeypatch.setattr('requests.get', mock_requests_get)
+    monkeypatch.setattr('cozymeal.fetch.get', mock_fetch_get)
 
     page_of_articles = articles._get_articles_from_archive_page(1)
 
@@ -234,15 +283,17 @@ def test_get_article_from_archive_page_404(monkeypatch: MonkeyPatch) -> None:
 def test_get_article_from_archive_page_network_error(monkeypatch: MonkeyPatch) -> None:
     """Test response if unable to connect to archive page."""
 
-    # Class to patch requests.get.
+    # Class to patch fetch.get.
     class MockResponse:
+        status_code = 200
+
         def raise_for_status(self) -> None:
             raise ConnectionError()
 
-    def mock_requests_get(_) -> None:
+    def mock_fetch_get(url: str, **kwargs) -> None:
         return MockResponse()
 
-    monkeypatch.setattr('requests.get', mock_requests_get)
+    monkeypatch.setattr('cozymeal.fetch.get', mock_fetch_get)
 
     with pytest.raises(ConnectionError):
         articles._get_articles_from_archive_page(1)
@@ -250,91 +301,262 @@ def test_get_article_from_archive_page_network_error(monkeypatch: MonkeyPatch) -
 def test_get_articles_from_archive_page_empty_response(monkeypatch: MonkeyPatch) -> None:
     """Test response if no articles are found."""
 
-    # Class to patch requests.get.
+    # Class to patch fetch.get.
     class MockResponse:
         def __init__(self) -> None:
+            self.status_code = 200
+            self.headers = {}
             self.text = ""
 
         def raise_for_status(self) -> None:
             pass
 
-    def mock_requests_get(_) -> None:
+    def mock_fetch_get(url: str, **kwargs) -> None:
         return MockResponse()
 
-    monkeypatch.setattr('requests.get', mock_requests_get)
+    monkeypatch.setattr('cozymeal.fetch.get', mock_fetch_get)
 
     page_of_articles = articles._get_articles_from_archive_page(1)
 
     # The function should return a falsy value.
     assert not page_of_articles
 
-def test_get_new_articles_with_new_articles(monkeypatch: MonkeyPatch):
-    """Test filtering to ensure new articles are returned."""
-    expected_articles_list = [
-        Article(TEST_TITLE, TEST_URL, TEST_DATE_PUBLISHED + tdelta(days=1)),
-        Article(TEST_TITLE + " 2", TEST_URL, TEST_DATE_PUBLISHED + tdelta(days=2)),
+def _mock_archive(monkeypatch: MonkeyPatch, pages: list[list[Article]]) -> list[int]:
+    """Serve a fixed list of archive pages and record which ones were requested."""
+    requested_pages = []
+
+    def mock_get_articles_from_archive_page(page: int, stats: articles.CrawlStats | None = None, source: Source | None = None) -> list[Article]:
+        requested_pages.append(page)
+        return pages[page - 1] if page <= len(pages) else []
+
+    monkeypatch.setattr("cozymeal.articles._get_articles_from_archive_page", mock_get_articles_from_archive_page)
+    return requested_pages
+
+def test_get_articles_stops_at_cutoff(monkeypatch: MonkeyPatch):
+    """Test that crawling stops once a page reaches past the cutoff."""
+    pages = [
+        [Article(TEST_TITLE, f"{TEST_URL}/{d}", TEST_DATE_PUBLISHED + tdelta(days=d)) for d in (6, 5)],
+        [Article(TEST_TITLE, f"{TEST_URL}/{d}", TEST_DATE_PUBLISHED + tdelta(days=d)) for d in (4, 3)],
+        [Article(TEST_TITLE, f"{TEST_URL}/{d}", TEST_DATE_PUBLISHED + tdelta(days=d)) for d in (2, 1)],
+    ]
+    requested_pages = _mock_archive(monkeypatch, pages)
+
+    articles_list = articles.get_articles(cutoff=TEST_DATE_PUBLISHED + tdelta(days=4), workers=1)
+
+    # The second page crosses the cutoff, so the third should never be fetched.
+    assert requested_pages == [1, 2]
+    assert len(articles_list) == 4
+
+def test_get_articles_without_cutoff_crawls_everything(monkeypatch: MonkeyPatch):
+    """Test that crawling without a cutoff walks the whole archive."""
+    pages = [
+        [Article(TEST_TITLE, f"{TEST_URL}/2", TEST_DATE_PUBLISHED + tdelta(days=2))],
+        [Article(TEST_TITLE, f"{TEST_URL}/1", TEST_DATE_PUBLISHED + tdelta(days=1))],
     ]
+    requested_pages = _mock_archive(monkeypatch, pages)
 
-    # Mock the get_articles function to return a fixed list of articles.
-    def mock_get_articles() -> list[Article]:
-        return expected_articles_list
+    articles_list = articles.get_articles(workers=1)
 
-    monkeypatch.setattr("cozymeal.articles.get_articles", mock_get_articles)
+    assert requested_pages == [1, 2, 3]
+    assert len(articles_list) == 2
 
-    articles_list = list(articles.get_new_articles(last_checked=TEST_DATE_PUBLISHED))
+def test_get_articles_unordered_archive_falls_back(monkeypatch: MonkeyPatch):
+    """Test that an archive out of date order is crawled in full."""
+    pages = [
+        [Article(TEST_TITLE, f"{TEST_URL}/{d}", TEST_DATE_PUBLISHED + tdelta(days=d)) for d in (6, 5)],
+        [Article(TEST_TITLE, f"{TEST_URL}/{d}", TEST_DATE_PUBLISHED + tdelta(days=d)) for d in (1, 7)],
+        [Article(TEST_TITLE, f"{TEST_URL}/{d}", TEST_DATE_PUBLISHED + tdelta(days=d)) for d in (3, 2)],
+    ]
+    requested_pages = _mock_archive(monkeypatch, pages)
 
-    # Check that the length of the two lists is the same.
-    # This assures that no duplicates are added in the filtering process.
-    assert len(articles_list) == len(expected_articles_list)
+    articles_list = articles.get_articles(cutoff=TEST_DATE_PUBLISHED + tdelta(days=4), workers=1)
 
-    # Check that the two lists have the same elements.
-    assert set(articles_list) == set(expected_articles_list)
+    assert requested_pages == [1, 2, 3, 4]
+    assert len(articles_list) == 6
 
-def test_get_new_articles_with_old_articles(monkeypatch: MonkeyPatch):
-    """Test filtering to ensure old articles are filtered."""
-    expected_articles_list = [
-        Article(TEST_TITLE, TEST_URL, TEST_DATE_PUBLISHED - tdelta(days=1)),
-        Article(TEST_TITLE + " 2", TEST_URL, TEST_DATE_PUBLISHED - tdelta(days=2)),
+def test_get_articles_skips_articles_repeated_across_pages(monkeypatch: MonkeyPatch):
+    """Test that an article pushed onto the next page mid-crawl is only returned once."""
+    pages = [
+        [Article(TEST_TITLE, f"{TEST_URL}/{d}", TEST_DATE_PUBLISHED + tdelta(days=d)) for d in (6, 5)],
+        [Article(TEST_TITLE, f"{TEST_URL}/{d}", TEST_DATE_PUBLISHED + tdelta(days=d)) for d in (5, 4)],
     ]
+    _mock_archive(monkeypatch, pages)
 
-    # Mock the get_articles function to return a fixed list of articles.
-    def mock_get_articles() -> list[Article]:
-        return expected_articles_list
+    articles_list = articles.get_articles(workers=1)
 
-    monkeypatch.setattr("cozymeal.articles.get_articles", mock_get_articles)
+    assert [a.url for a in articles_list] == [f"{TEST_URL}/{d}" for d in (6, 5, 4)]
 
-    articles_list = list(articles.get_new_articles(last_checked=TEST_DATE_PUBLISHED))
+def test_get_articles_concurrent_preserves_page_order(archive_server: Callable[..., ArchiveServer]):
+    """Test that pages fetched concurrently come back in archive order."""
+    archive_server(pages=6)
 
-    # Check that the function returns an empty list.
-    assert len(articles_list) == 0
+    articles_list = articles.get_articles(workers=4)
 
-def test_get_new_articles_empty_list(monkeypatch: MonkeyPatch):
-    """Test filtering with an empty list."""
-    # Mock the get_articles function to return a fixed list of articles.
-    def mock_get_articles() -> list[Article]:
-        return []
+    assert [a.title for a in articles_list] == [f"Article {i}" for i in range(12)]
 
-    monkeypatch.setattr("cozymeal.articles.get_articles", mock_get_articles)
+def test_get_articles_fetches_concurrently(archive_server: Callable[..., ArchiveServer]):
+    """Test that pages are fetched several at a time, overlapping their latency."""
+    server = archive_server(pages=8, latency=0.1)
 
-    articles_list = list(articles.get_new_articles(last_checked=TEST_DATE_PUBLISHED))
+    articles_list = articles.get_articles(workers=4)
 
-    # Check that the function returns an empty list.
-    assert len(articles_list) == 0
+    # Sequential fetches would never have more than one request in flight.
+    assert len(articles_list) == 16
+    assert 1 < server.peak_in_flight <= 4
+    assert set(range(1, 10)) <= set(server.requested_pages)
 
-def test_get_new_articles_sorting_order(monkeypatch: MonkeyPatch):
-    """Test that filtering returns the articles in reverse date order."""
-    expected_articles_list = [
-        Article(TEST_TITLE, TEST_URL, TEST_DATE_PUBLISHED + tdelta(days=1)),
-        Article(TEST_TITLE + " 2", TEST_URL, TEST_DATE_PUBLISHED + tdelta(days=2)),
-    ]
+@pytest.fixture
+def parsed_pages(monkeypatch: MonkeyPatch) -> list[str]:
+    """Record every archive page body that actually gets parsed."""
+    parsed = []
+    parse_archive_page = articles._parse_archive_page
+
+    def mock_parse_archive_page(raw_data: str, source: Source | None = None) -> list[Article]:
+        parsed.append(raw_data)
+        return parse_archive_page(raw_data, source)
+
+    monkeypatch.setattr("cozymeal.articles._parse_archive_page", mock_parse_archive_page)
+    return parsed
 
-    # Mock the get_articles function to return a fixed list of articles.
-    def mock_get_articles() -> list[Article]:
-        return expected_articles_list
+def test_get_articles_not_modified_pages_are_reused(archive_server: Callable[..., ArchiveServer], parsed_pages: list[str]):
+    """Test that pages answered with 304 reuse the articles parsed last time."""
+    archive_server(pages=3, etags=True)
+    first_articles = articles.get_articles(workers=1)
 
-    monkeypatch.setattr("cozymeal.articles.get_articles", mock_get_articles)
+    parsed_pages.clear()
+    stats = articles.CrawlStats()
+    second_articles = articles.get_articles(workers=1, stats=stats)
+
+    assert [a.to_dict() for a in second_articles] == [a.to_dict() for a in first_articles]
+    assert parsed_pages == []
+    assert stats.pages_skipped == 3
+    assert stats.bytes_downloaded == 0
+    assert stats.bytes_saved > 0
+
+def test_get_articles_unchanged_pages_skip_parsing(archive_server: Callable[..., ArchiveServer], parsed_pages: list[str]):
+    """Test that pages without validators but with the same body aren't parsed again."""
+    archive_server(pages=3)
+    first_articles = articles.get_articles(workers=1)
+
+    parsed_pages.clear()
+    stats = articles.CrawlStats()
+    second_articles = articles.get_articles(workers=1, stats=stats)
+
+    assert [a.to_dict() for a in second_articles] == [a.to_dict() for a in first_articles]
+    assert parsed_pages == []
+    assert stats.pages_skipped == 3
+    assert stats.bytes_downloaded > 0
+    assert stats.bytes_saved == 0
+
+def test_get_articles_retries_transient_errors(archive_server: Callable[..., ArchiveServer]):
+    """Test that a page failing with 5xx is retried instead of ending the crawl."""
+    server = archive_server(pages=3, failures={2: 2})
+
+    articles_list = articles.get_articles(workers=1)
+
+    assert len(articles_list) == 6
+    assert server.requested_pages.count(2) == 3
+
+def test_get_articles_retries_server_errors_through_the_limiter(archive_server: Callable[..., ArchiveServer]):
+    """Test that a 502 is retried by the fetch layer, where it also cuts how many requests are in flight."""
+    server = archive_server(pages=3, failures={1: 1}, failure_status=502)
+
+    articles_list = articles.get_articles(workers=1)
+
+    assert len(articles_list) == 6
+    assert server.requested_pages.count(1) == 2
+    assert fetch.get_limiter(urlparse(server.url).netloc).limit < settings.CRAWL_WORKERS
+
+def test_get_articles_persistent_errors_fail_the_crawl(archive_server: Callable[..., ArchiveServer]):
+    """Test that a page still failing after retries raises rather than truncating."""
+    archive_server(pages=3, failures={2: 100})
+
+    with pytest.raises(HTTPError):
+        articles.get_articles(workers=1)
+
+def test_get_articles_backs_off_when_throttled(archive_server: Callable[..., ArchiveServer], monkeypatch: MonkeyPatch):
+    """Test that a host answering 429 slows the crawl down instead of ending it."""
+    monkeypatch.setattr("cozymeal.settings.FETCH_RETRIES", 5)
+    server = archive_server(pages=10, latency=0.02, max_in_flight=1, retry_after="0")
+
+    articles_list = articles.get_articles(workers=4)
+
+    assert len(articles_list) == 20
+    assert server.throttled_at
+    assert fetch.get_limiter(urlparse(server.url).netloc).limit < 4
+
+def test_get_articles_honors_retry_after(archive_server: Callable[..., ArchiveServer]):
+    """Test that after a 429 with Retry-After no page is requested until it has passed."""
+    server = archive_server(pages=3, latency=0.05, max_in_flight=1, retry_after="0.3")
+
+    articles_list = articles.get_articles(workers=2)
+
+    assert len(articles_list) == 6
+    assert server.throttled_at
+    for throttled_at in server.throttled_at:
+        assert not any(throttled_at < t < throttled_at + 0.25 for t in server.request_times)
+
+def test_get_articles_persistent_throttling_fails_the_crawl(archive_server: Callable[..., ArchiveServer]):
+    """Test that a host that keeps throttling fails the crawl rather than truncating it."""
+    archive_server(pages=3, max_in_flight=0)
+
+    with pytest.raises(HTTPError):
+        articles.get_articles(workers=1)
+
+def test_get_articles_read_timeout(archive_server: Callable[..., ArchiveServer], monkeypatch: MonkeyPatch):
+    """Test that a page that never answers is retried through the limiter, cutting its cap, then raises."""
+    monkeypatch.setattr("cozymeal.settings.READ_TIMEOUT", 0.05)
+    server = archive_server(pages=3, latency=0.2)
+
+    with pytest.raises(RequestException):
+        articles.get_articles(workers=1)
+
+    assert server.requested_pages.count(1) == settings.FETCH_RETRIES + 1
+    assert fetch.get_limiter(urlparse(server.url).netloc).limit == 1
+
+def test_parse_archive_page_matches_beautifulsoup():
+    """Test that the JSON-LD extractor finds the same articles a full parse does."""
+    raw_data = (Path(__file__).parent.parent / "bench" / "fixtures" / "archive_page.html").read_text()
+
+    soup = BeautifulSoup(raw_data, "html.parser")
+    scripts = filter(lambda s: "Sarah" in s.text, soup.find_all("script"))
+    expected_articles = [a for a in map(articles._get_article_from_script, scripts) if a]
+    for article in expected_articles:
+        article.source = DEFAULT_SOURCE.name
+
+    page_of_articles = articles._parse_archive_page(raw_data)
+
+    assert len(page_of_articles) == 12
+    assert [a.to_dict() for a in page_of_articles] == [a.to_dict() for a in expected_articles]
+
+def test_parse_archive_page_without_author():
+    """Test that a source without an author takes every article on the page, skipping scripts that aren't articles."""
+    raw_data = (Path(__file__).parent.parent / "bench" / "fixtures" / "archive_page.html").read_text()
+    raw_data = raw_data.replace("</body>", """
+    <script type="application/ld+json">[{"@type": "ItemList"}, {"@type": "ItemList"}]</script>
+    <script type="application/ld+json">{"name": "Broken",}</script>
+    <script type="application/ld+json">{"name": "No page", "mainEntityOfPage": "https://example.com"}</script>
+    </body>""")
+    source = Source("category", "https://www.cozymeal.com/magazine/category/recipes")
+
+    page_of_articles = articles._parse_archive_page(raw_data, source)
+
+    # The fixture's 12 articles, without its other JSON-LD, its untyped and
+    # empty scripts, or the scripts added above.
+    assert len(page_of_articles) == 12
+    assert all(a.source == "category" for a in page_of_articles)
+
+def test_iter_json_ld_scripts_skips_other_scripts():
+    """Test that only JSON-LD and untyped scripts are extracted."""
+    raw_data = """\
+    <script type="application/ld+json">{"a": 1}</script>
+    <SCRIPT TYPE='Application/LD+JSON'>{"b": 2}</SCRIPT >
+    <script>{"c": 3}</script>
+    <script type="text/javascript">var d = 4;</script>
+    <script data-type="x" src="/e.js"></script>
+    <!-- <script type="application/ld+json">{"f": 6}</script> -->
+    """
 
-    articles_list: list[Article] = list(articles.get_new_articles(last_checked=TEST_DATE_PUBLISHED))
+    scripts = list(articles._iter_json_ld_scripts(raw_data))
 
-    # Check that the articles are sorted in reverse date order.
-    assert articles_list[0].date_published > articles_list[1].date_published
+    assert scripts == ['{"a": 1}', '{"b": 2}', '{"c": 3}', '']
@@ -0,0 +1,58 @@
+from cozymeal import emails, settings
+from cozymeal.articles import Article
+from datetime import datetime as dt
+from email import message_from_bytes
+from pytest import MonkeyPatch
+
+TEST_ARTICLES = [
+    Article("Fish &amp; Chips", "https://example.com/1", dt(2024, 6, 2, tzinfo=settings.DEFAULT_TZ)),
+    Article("Pasta", "https://example.com/2", dt(2024, 6, 1, tzinfo=settings.DEFAULT_TZ)),
+]
+
+def test_render_digest() -> None:
+    """Test that the digest lists every article in both the text and the HTML part."""
+    text, html = emails.render_digest(TEST_ARTICLES)
+
+    assert text.splitlines() == [
+        "Some new articles were published from your backlog!",
+        "",
+        "06/02/2024: Fish & Chips (https://example.com/1)",
+        "06/01/2024: Pasta (https://example.com/2)",
+    ]
+    assert '<a href="https://example.com/1">Fish &amp; Chips</a>' in html
+    assert "<b>06/01/2024</b>" in html
+
+def test_render_digest_reuses_article_fragments(monkeypatch: MonkeyPatch) -> None:
+    """Test that an article already rendered isn't sent through the template again."""
+    emails._render_article.cache_clear()
+    renders = []
+    template = emails.get_template(emails.ARTICLE_HTML)
+    render = template.render
+    monkeypatch.setattr(template, "render", lambda **kwargs: renders.append(kwargs) or render(**kwargs))
+
+    emails.render_digest(TEST_ARTICLES)
+    emails.render_digest(TEST_ARTICLES[:1])
+
+    assert len(renders) == 2
+
+def test_address_message() -> None:
+    """Test that one built message can be addressed to several recipients."""
+    message = emails.build_message(*emails.render_digest(TEST_ARTICLES))
+
+    for recipient in ("a@example.com", "b@example.com"):
+        parsed = message_from_bytes(emails.address_message(message, recipient))
+        assert parsed["To"] == recipient
+        assert parsed["Subject"] == emails.EMAIL_SUBJECT
+        assert [part.get_content_type() for part in parsed.get_payload()] == ["text/plain", "text/html"]
+
+def test_render_digest_marks_updated_articles() -> None:
+    """Test that articles in the digest because of an edit are labelled as updated."""
+    updated = Article("Pasta", "https://example.com/2", dt(2024, 6, 1, tzinfo=settings.DEFAULT_TZ), updated=True)
+
+    text, html = emails.render_digest([TEST_ARTICLES[0], updated])
+
+    assert text.splitlines()[-2:] == [
+        "06/02/2024: Fish & Chips (https://example.com/1)",
+        "06/01/2024: Pasta (https://example.com/2) (updated)",
+    ]
+    assert html.count("(updated)") == 1
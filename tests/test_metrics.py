@@ -0,0 +1,108 @@
+import json
+import logging
+import os
+import pytest
+import subprocess
+import sys
+import threading
+import time
+
+from cozymeal import metrics, settings
+from pytest import LogCaptureFixture
+
+def test_timed_records_histogram() -> None:
+    """Test that a timed block is counted in the right buckets."""
+    with metrics.timed("stage"):
+        pass
+
+    output = metrics.render()
+    assert 'cozymeal_stage_duration_seconds_count{stage="stage"} 1' in output
+    assert 'cozymeal_stage_errors_total{stage="stage"} 0' in output
+    assert 'cozymeal_stage_duration_seconds_bucket{stage="stage",le="0.005"} 1' in output
+
+def test_timed_records_errors() -> None:
+    """Test that a block ending in an exception is counted as an error and re-raised."""
+    with pytest.raises(ValueError):
+        with metrics.timed("stage"):
+            raise ValueError()
+
+    assert 'cozymeal_stage_errors_total{stage="stage"} 1' in metrics.render()
+
+def test_timed_logs_json(caplog: LogCaptureFixture) -> None:
+    """Test that every timing is also logged as a JSON line."""
+    with caplog.at_level(logging.INFO, logger="cozymeal.metrics"):
+        with metrics.timed("stage", url="https://example.com"):
+            pass
+
+    line = json.loads(caplog.records[-1].getMessage())
+    assert line["event"] == "timing"
+    assert line["stage"] == "stage"
+    assert line["url"] == "https://example.com"
+    assert line["ok"] is True
+
+def test_render_sums_every_worker() -> None:
+    """Test that /metrics output includes numbers flushed by other processes."""
+    metrics.observe("fetch", 0.02)
+    metrics.increment("pages_skipped", 2)
+
+    settings.METRICS_DIR.mkdir(parents=True, exist_ok=True)
+    other_worker = {
+        "histograms": {"fetch": {"buckets": [0] * len(metrics.BUCKETS), "sum": 1.5, "count": 1, "errors": 1}},
+        "counters": {"pages_skipped": 3},
+    }
+    (settings.METRICS_DIR / "1.json").write_text(json.dumps(other_worker))
+
+    output = metrics.render()
+
+    assert "# TYPE cozymeal_stage_duration_seconds histogram" in output
+    assert 'cozymeal_stage_duration_seconds_bucket{stage="fetch",le="0.025"} 1' in output
+    assert 'cozymeal_stage_duration_seconds_bucket{stage="fetch",le="+Inf"} 2' in output
+    assert 'cozymeal_stage_duration_seconds_count{stage="fetch"} 2' in output
+    assert 'cozymeal_stage_errors_total{stage="fetch"} 1' in output
+    assert "cozymeal_pages_skipped_total 5" in output
+
+def test_trailing_numbers_are_flushed(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test that numbers recorded too soon after a flush are written out shortly after."""
+    monkeypatch.setattr("cozymeal.metrics.FLUSH_INTERVAL", 0.05)
+    metrics.increment("requests")
+    metrics.increment("requests")
+
+    time.sleep(0.3)
+
+    data = json.loads((settings.METRICS_DIR / f"{os.getpid()}.json").read_text())
+    assert data["counters"]["requests"] == 2
+
+def test_render_prunes_exited_workers() -> None:
+    """Test that snapshot files of processes that are gone are dropped and removed."""
+    exited = subprocess.Popen([sys.executable, "-c", "pass"])
+    exited.wait()
+    settings.METRICS_DIR.mkdir(parents=True, exist_ok=True)
+    stale = settings.METRICS_DIR / f"{exited.pid}.json"
+    stale.write_text(json.dumps({"histograms": {}, "counters": {"requests": 7}}))
+    metrics.increment("requests")
+
+    output = metrics.render()
+
+    assert "cozymeal_requests_total 1" in output
+    assert not stale.exists()
+
+def test_threads_share_snapshot_file(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test that threads of one worker flushing at once neither fail nor lose counts."""
+    monkeypatch.setattr("cozymeal.metrics.FLUSH_INTERVAL", 0)
+    errors = []
+
+    def count() -> None:
+        try:
+            for _ in range(50):
+                metrics.increment("requests")
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=count) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert "cozymeal_requests_total 400" in metrics.render()
@@ -0,0 +1,218 @@
+import json
+import logging
+import pytest
+import smtplib
+import socket
+
+from aiosmtpd.controller import Controller
+from contextlib import contextmanager
+from cozymeal import outbox, settings
+from cozymeal.articles import Article
+from cozymeal.subscribers import Subscriber
+from datetime import datetime as dt
+from email import message_from_bytes
+from pathlib import Path
+from pytest import LogCaptureFixture, MonkeyPatch
+from typing import Any, Iterator
+
+TEST_ARTICLES = [Article("Fish &amp; Chips", "https://example.com/1", dt(2024, 6, 1, tzinfo=settings.DEFAULT_TZ))]
+FILTER_ARTICLES = [
+    Article("Fish &amp; Chips", "https://example.com/1", dt(2024, 6, 1, tzinfo=settings.DEFAULT_TZ), "sarah-salisbury"),
+    Article("Best Pasta", "https://example.com/2", dt(2024, 6, 2, tzinfo=settings.DEFAULT_TZ), "other-author"),
+]
+
+class MockSMTP:
+    def __init__(self, fail_on: set[str] | None = None, disconnect: bool = False):
+        self.sent = []
+        self.connections = 0
+        self.fail_on = fail_on or set()
+        self.disconnect = disconnect
+
+    @contextmanager
+    def connection(self) -> Iterator["MockSMTP"]:
+        self.connections += 1
+        if self.disconnect:
+            raise smtplib.SMTPServerDisconnected()
+        yield self
+
+    def send(self, server: "MockSMTP", recipient: str, message: bytes) -> None:
+        if recipient in self.fail_on:
+            raise smtplib.SMTPRecipientsRefused({recipient: (550, b"No such user")})
+        self.sent.append(message_from_bytes(message))
+
+@pytest.fixture
+def smtp(monkeypatch: MonkeyPatch) -> MockSMTP:
+    """Replace the SMTP connection with one that records what it sends."""
+    mock_smtp = MockSMTP()
+    monkeypatch.setattr("cozymeal.emails.smtp_connection", mock_smtp.connection)
+    monkeypatch.setattr("cozymeal.emails.send_message", mock_smtp.send)
+    monkeypatch.setattr("cozymeal.settings.RECEIVER_EMAIL", "receiver@example.com")
+    return mock_smtp
+
+def test_drain_sends_over_one_connection(smtp: MockSMTP) -> None:
+    """Test that queued messages are all sent over a single connection and marked sent."""
+    outbox.enqueue(TEST_ARTICLES, [Subscriber("a@example.com"), Subscriber("b@example.com")])
+    outbox.enqueue(TEST_ARTICLES)
+
+    assert outbox.drain() == 3
+    assert smtp.connections == 1
+    assert [m["To"] for m in smtp.sent] == ["a@example.com", "b@example.com", "receiver@example.com"]
+    assert outbox.get_due_messages() == []
+
+def test_drain_nothing_queued(smtp: MockSMTP) -> None:
+    """Test that an empty outbox doesn't open a connection."""
+    assert outbox.drain() == 0
+    assert smtp.connections == 0
+
+def test_drain_retries_after_backoff(smtp: MockSMTP) -> None:
+    """Test that a failed connection leaves messages queued until their backoff passes."""
+    outbox.enqueue(TEST_ARTICLES)
+    smtp.disconnect = True
+
+    assert outbox.drain() == 0
+    assert outbox.get_due_messages() == []
+
+    # Once the backoff is over the message is due again and goes out.
+    with outbox._connect() as connection:
+        connection.execute("UPDATE messages SET next_attempt_at = 0")
+    smtp.disconnect = False
+
+    assert outbox.drain() == 1
+    assert len(smtp.sent) == 1
+
+def test_drain_refused_recipient_does_not_block_others(smtp: MockSMTP) -> None:
+    """Test that one refused address doesn't stop the rest of the batch."""
+    smtp.fail_on = {"bad@example.com"}
+    outbox.enqueue(TEST_ARTICLES, [Subscriber("bad@example.com"), Subscriber("good@example.com")])
+
+    assert outbox.drain() == 1
+    assert [m["To"] for m in smtp.sent] == ["good@example.com"]
+
+def test_drain_gives_up_after_max_attempts(smtp: MockSMTP, monkeypatch: MonkeyPatch, caplog: LogCaptureFixture) -> None:
+    """Test that a message stops being retried, with an error logged, after OUTBOX_MAX_ATTEMPTS."""
+    monkeypatch.setattr("cozymeal.settings.OUTBOX_RETRY_BACKOFF", 0)
+    monkeypatch.setattr("cozymeal.settings.OUTBOX_MAX_ATTEMPTS", 2)
+    smtp.disconnect = True
+    outbox.enqueue(TEST_ARTICLES)
+
+    with caplog.at_level(logging.ERROR, logger="cozymeal.outbox"):
+        outbox.drain()
+        assert caplog.records == []
+        outbox.drain()
+
+    assert outbox.get_due_messages() == []
+    assert smtp.connections == 2
+    assert "receiver@example.com" in caplog.records[-1].getMessage()
+
+def test_drain_prunes_old_messages(smtp: MockSMTP, monkeypatch: MonkeyPatch) -> None:
+    """Test that sent and abandoned messages are deleted once past OUTBOX_RETENTION."""
+    monkeypatch.setattr("cozymeal.settings.OUTBOX_MAX_ATTEMPTS", 1)
+    smtp.fail_on = {"bad@example.com"}
+    outbox.enqueue(TEST_ARTICLES, [Subscriber("bad@example.com"), Subscriber("good@example.com")])
+    outbox.drain()
+
+    with outbox._connect() as connection:
+        assert connection.execute("SELECT COUNT(*) FROM messages").fetchone()[0] == 2
+
+    monkeypatch.setattr("cozymeal.settings.OUTBOX_RETENTION", -1)
+    outbox.drain()
+
+    with outbox._connect() as connection:
+        assert connection.execute("SELECT COUNT(*) FROM messages").fetchone()[0] == 0
+
+def test_enqueued_articles_are_not_sent_again(smtp: MockSMTP) -> None:
+    """Test that queued articles are filtered out of later digests until they change."""
+    articles_list = [Article(f"Article {i}", f"https://example.com/{i}", dt(2024, 6, 1, tzinfo=settings.DEFAULT_TZ)) for i in range(3)]
+
+    outbox.enqueue(articles_list[:2])
+    assert outbox.get_unsent_articles(articles_list) == articles_list[2:]
+
+    articles_list[0].date_modified = dt(2024, 6, 2, tzinfo=settings.DEFAULT_TZ)
+    assert outbox.get_unsent_articles(articles_list) == [articles_list[0], articles_list[2]]
+
+    outbox.enqueue(articles_list)
+    assert outbox.get_unsent_articles(articles_list) == []
+
+def test_enqueue_applies_subscriber_filters(smtp: MockSMTP) -> None:
+    """Test that each subscriber only gets the articles matching their filters."""
+    outbox.enqueue(FILTER_ARTICLES, [
+        Subscriber("all@example.com"),
+        Subscriber("source@example.com", sources=["other-author"]),
+        Subscriber("keyword@example.com", keywords=["FISH"]),
+        Subscriber("nothing@example.com", keywords=["sushi"]),
+    ])
+
+    messages = outbox.get_due_messages()
+    assert {m.recipient: [a.url for a in m.articles] for m in messages} == {
+        "all@example.com": ["https://example.com/1", "https://example.com/2"],
+        "source@example.com": ["https://example.com/2"],
+        "keyword@example.com": ["https://example.com/1"],
+    }
+
+def test_enqueue_reads_subscribers_file(smtp: MockSMTP, data_dir: Path) -> None:
+    """Test that the subscriber list is loaded from SUBSCRIBERS_FILENAME when given."""
+    (data_dir / "subscribers.json").write_text(json.dumps([
+        {"email": "a@example.com"},
+        {"email": "b@example.com", "sources": ["sarah-salisbury"]},
+    ]))
+    outbox.enqueue(FILTER_ARTICLES)
+
+    assert [(m.recipient, len(m.articles)) for m in outbox.get_due_messages()] == [
+        ("a@example.com", 2),
+        ("b@example.com", 1),
+    ]
+
+class RecordingHandler:
+    def __init__(self):
+        self.envelopes = []
+        self.peers = set()
+
+    async def handle_DATA(self, server: Any, session: Any, envelope: Any) -> str:
+        self.envelopes.append(envelope)
+        self.peers.add(session.peer)
+        return "250 OK"
+
+@pytest.fixture
+def smtp_server(monkeypatch: MonkeyPatch) -> Iterator[RecordingHandler]:
+    """Run a local SMTP server and point the sender at it."""
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+
+    handler = RecordingHandler()
+    controller = Controller(handler, hostname="127.0.0.1", port=port)
+    controller.start()
+
+    monkeypatch.setattr("cozymeal.settings.SMTP_HOST", controller.hostname)
+    monkeypatch.setattr("cozymeal.settings.SMTP_PORT", port)
+    monkeypatch.setattr("cozymeal.settings.SMTP_SSL", False)
+    monkeypatch.setattr("cozymeal.settings.EMAIL_PASSWORD", "")
+    monkeypatch.setattr("cozymeal.settings.SMTP_MAX_MESSAGES_PER_SECOND", 0)
+    yield handler
+
+    controller.stop()
+
+def test_drain_sends_batch_over_one_session(smtp_server: RecordingHandler, monkeypatch: MonkeyPatch) -> None:
+    """Test that a whole batch of subscribers goes out over one SMTP session, rendered once."""
+    renders = []
+    render_digest = outbox.cze.render_digest
+    monkeypatch.setattr("cozymeal.emails.render_digest", lambda articles: renders.append(articles) or render_digest(articles))
+    recipients = [f"user{i}@example.com" for i in range(50)]
+    outbox.enqueue(TEST_ARTICLES, [Subscriber(r) for r in recipients])
+
+    assert outbox.drain() == 50
+    assert len(smtp_server.peers) == 1
+    assert len(renders) == 1
+    assert [e.rcpt_tos for e in smtp_server.envelopes] == [[r] for r in recipients]
+
+    message = message_from_bytes(smtp_server.envelopes[0].content)
+    assert message["To"] == "user0@example.com"
+    assert "Fish & Chips" in message.get_payload(0).get_payload()
+
+def test_drain_reconnects_between_batches(smtp_server: RecordingHandler, monkeypatch: MonkeyPatch) -> None:
+    """Test that SMTP_BATCH_SIZE caps how many messages share a session."""
+    monkeypatch.setattr("cozymeal.settings.SMTP_BATCH_SIZE", 4)
+    outbox.enqueue(TEST_ARTICLES, [Subscriber(f"user{i}@example.com") for i in range(10)])
+
+    assert outbox.drain() == 10
+    assert len(smtp_server.peers) == 3
@@ -0,0 +1,137 @@
+import threading
+import time
+
+from cozymeal import ratelimit
+
+def test_rate_limiter_spaces_requests() -> None:
+    """Test that requests from many threads are spread out to the configured rate."""
+    limiter = ratelimit.RateLimiter(rate=50)
+    times = []
+
+    def acquire() -> None:
+        limiter.wait()
+        times.append(time.monotonic())
+
+    threads = [threading.Thread(target=acquire) for _ in range(10)]
+    start = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # Ten slots at 50 per second take at least 9 intervals of 20 ms.
+    assert max(times) - start >= 9 / 50 - 0.01
+
+def test_rate_limiter_disabled() -> None:
+    """Test that a rate of zero never waits."""
+    limiter = ratelimit.RateLimiter(rate=0)
+
+    start = time.monotonic()
+    for _ in range(100):
+        limiter.wait()
+
+    assert time.monotonic() - start < 0.05
+
+def test_adaptive_limiter_caps_requests_in_flight() -> None:
+    """Test that a request beyond the concurrency cap waits for one to finish."""
+    limiter = ratelimit.AdaptiveLimiter(rate=0, concurrency=1)
+    started = limiter.acquire()
+    acquired = threading.Event()
+
+    threading.Thread(target=lambda: limiter.acquire() and acquired.set(), daemon=True).start()
+    assert not acquired.wait(0.05)
+
+    limiter.release(started)
+    assert acquired.wait(1)
+
+def test_adaptive_limiter_increases_additively() -> None:
+    """Test that fast responses raise the cap about one per round of requests, up to the maximum."""
+    limiter = ratelimit.AdaptiveLimiter(rate=0, concurrency=2, max_concurrency=4)
+
+    for _ in range(3):
+        limiter.release(limiter.acquire())
+    assert int(limiter.limit) == 3
+
+    for _ in range(100):
+        limiter.release(limiter.acquire())
+    assert limiter.limit == 4
+
+def test_adaptive_limiter_halves_once_per_burst_of_throttling() -> None:
+    """Test that throttled responses to requests sent together halve the cap only once."""
+    limiter = ratelimit.AdaptiveLimiter(rate=0, concurrency=8)
+    started = [limiter.acquire() for _ in range(8)]
+
+    for request_started in started:
+        limiter.release(request_started, throttled=True)
+    assert limiter.limit == 4
+
+    limiter.release(limiter.acquire(), throttled=True)
+    assert limiter.limit == 2
+
+def test_adaptive_limiter_halves_on_slow_responses() -> None:
+    """Test that a response far slower than usual counts like throttling."""
+    limiter = ratelimit.AdaptiveLimiter(rate=0, concurrency=8, min_slow_latency=0.1)
+    limiter.release(limiter.acquire())
+
+    limiter.release(limiter.acquire() - 1.0)
+
+    assert limiter.limit == (8 + 1 / 8) / 2
+
+def test_adaptive_limiter_judges_latency_per_status_class() -> None:
+    """Test that a quick 304 or 404 doesn't make ordinary pages look slow."""
+    limiter = ratelimit.AdaptiveLimiter(rate=0, concurrency=4)
+    limiter.release(limiter.acquire() - 0.02, 304)
+    limiter.release(limiter.acquire() - 0.02, 404)
+
+    for _ in range(20):
+        limiter.release(limiter.acquire() - 0.3, 200)
+
+    assert limiter.limit > 4
+
+def test_adaptive_limiter_baseline_decays() -> None:
+    """Test that one unusually fast response only cuts the cap until the average catches up."""
+    limiter = ratelimit.AdaptiveLimiter(rate=0, concurrency=4)
+    limiter.release(limiter.acquire() - 0.02, 200)
+
+    limits = []
+    for _ in range(30):
+        limiter.release(limiter.acquire() - 0.3, 200)
+        limits.append(limiter.limit)
+
+    assert min(limits) < 4
+    assert limits[-1] > limits[-2] > min(limits)
+
+def test_adaptive_limiter_halves_on_timeouts_and_server_errors() -> None:
+    """Test that a timeout or a 5xx cuts the cap like throttling, while a refused connection leaves it alone."""
+    limiter = ratelimit.AdaptiveLimiter(rate=0, concurrency=8)
+
+    limiter.release(limiter.acquire() - 10.0, failed=True)
+    assert limiter.limit == 8
+    assert limiter.in_flight == 0
+
+    limiter.release(limiter.acquire(), timed_out=True)
+    assert limiter.limit == 4
+
+    limiter.release(limiter.acquire(), 502)
+    assert limiter.limit == 2
+
+def test_adaptive_limiter_holds_requests_for_retry_after() -> None:
+    """Test that after a Retry-After no request goes out until it has passed."""
+    limiter = ratelimit.AdaptiveLimiter(rate=0, concurrency=4)
+    limiter.release(limiter.acquire(), throttled=True, retry_after=0.2)
+
+    start = time.monotonic()
+    limiter.acquire()
+
+    assert time.monotonic() - start >= 0.19
+
+def test_adaptive_limiter_paces_with_token_bucket() -> None:
+    """Test that past the burst, requests go out at the configured rate."""
+    limiter = ratelimit.AdaptiveLimiter(rate=50, burst=5, concurrency=16)
+
+    start = time.monotonic()
+    for _ in range(10):
+        limiter.acquire()
+
+    # Five go out at once, the other five 20 ms apart.
+    assert 5 / 50 - 0.01 <= time.monotonic() - start < 0.5
@@ -0,0 +1,110 @@
+from cozymeal import search, settings, store
+from cozymeal.articles import Article
+from cozymeal.search import SearchIndex
+from datetime import datetime as dt, timedelta as tdelta
+from pytest import MonkeyPatch
+
+TEST_DATE = dt(2024, 6, 1, 12, tzinfo=settings.DEFAULT_TZ)
+
+def _make_article(title: str, days: int) -> Article:
+    return Article(title, f"https://example.com/{days}", TEST_DATE + tdelta(days=days))
+
+TEST_ARTICLES = [
+    _make_article("Fish &amp; Chips", 1),
+    _make_article("Fisherman's Pie", 2),
+    _make_article("Chip Shop Classics", 3),
+    _make_article("Crème Brûlée", 4),
+]
+
+def _titles(articles_list: list[Article]) -> list[str]:
+    return [a.get_pretty_title() for a in articles_list]
+
+def test_tokenize() -> None:
+    """Test that titles are split into lowercase words, punctuation dropped."""
+    assert search.tokenize("Fisherman's Pie: Crème Brûlée!") == ["fisherman", "s", "pie", "crème", "brûlée"]
+
+def test_search_matches_word_prefixes() -> None:
+    """Test that every query word has to start a word of the displayed title."""
+    index = SearchIndex()
+    index.add(TEST_ARTICLES)
+
+    assert _titles(index.search("fish")) == ["Fisherman's Pie", "Fish & Chips"]
+    assert _titles(index.search("CHI")) == ["Chip Shop Classics", "Fish & Chips"]
+    assert _titles(index.search("chips fish")) == ["Fish & Chips"]
+    assert _titles(index.search("brûl")) == ["Crème Brûlée"]
+    assert index.search("amp") == []
+    assert index.search("ish") == []
+    assert index.search("!!") == []
+
+def test_search_ranks_by_recency() -> None:
+    """Test that matches come newest first, cut off at the limit."""
+    index = SearchIndex()
+    index.add([_make_article(f"Salad {i}", i) for i in range(20)])
+
+    assert _titles(index.search("salad", limit=3)) == ["Salad 19", "Salad 18", "Salad 17"]
+    assert len(index.search("salad")) == 20
+
+def test_broad_queries_rank_like_narrow_ones() -> None:
+    """Test that a query matching most of the index, which is answered by scanning, ranks the same."""
+    index = SearchIndex()
+    index.add([_make_article(f"{'Soup' if i % 3 else 'Stew'} {i}", i) for i in range(300)])
+
+    for query in ("s", "soup", "stew", "s 1"):
+        assert index.search(query, limit=5) == index.search(query)[:5]
+
+def test_search_filters_like_query_articles() -> None:
+    """Test that date, source and cursor filters apply before the limit, even for broad queries."""
+    index = SearchIndex()
+    articles_list = [_make_article(f"Salad {i}", i) for i in range(300)]
+    for article in articles_list:
+        article.source = "odd" if article.date_published.day % 2 else "even"
+    index.add(articles_list)
+
+    since, until = TEST_DATE + tdelta(days=10), TEST_DATE + tdelta(days=20)
+    assert _titles(index.search("s", limit=3, since=since, until=until)) == ["Salad 19", "Salad 18", "Salad 17"]
+
+    after = (articles_list[17].date_published.timestamp(), articles_list[17].url)
+    assert _titles(index.search("salad", limit=2, until=until, after=after)) == ["Salad 16", "Salad 15"]
+
+    matches = index.search("salad", since=since, until=until, source="odd")
+    assert len(matches) == 5
+    assert all(a.source == "odd" for a in matches)
+
+def test_index_replaces_changed_titles() -> None:
+    """Test that re-adding an article drops the words of its old title."""
+    index = SearchIndex()
+    index.add(TEST_ARTICLES)
+
+    index.add([_make_article("Potato Wedges", 1)])
+
+    assert _titles(index.search("fish")) == ["Fisherman's Pie"]
+    assert _titles(index.search("wedge")) == ["Potato Wedges"]
+    assert len(index) == len(TEST_ARTICLES)
+
+def test_sync_builds_from_store() -> None:
+    """Test that a new index is built from stored articles, without a crawl."""
+    store.merge_articles(TEST_ARTICLES)
+
+    assert _titles(search.search("pie")) == ["Fisherman's Pie"]
+
+def test_sync_only_reads_changes(monkeypatch: MonkeyPatch) -> None:
+    """Test that later syncs only pull the articles merged since the last one."""
+    store.merge_articles(TEST_ARTICLES)
+    index = SearchIndex()
+    index.sync()
+
+    read = []
+    get_changed_articles = store.get_changed_articles
+    def counting_get_changed_articles(version: int) -> tuple[list[Article], int]:
+        articles_list, latest = get_changed_articles(version)
+        read.extend(articles_list)
+        return articles_list, latest
+    monkeypatch.setattr("cozymeal.store.get_changed_articles", counting_get_changed_articles)
+
+    index.sync()
+    assert read == []
+
+    store.merge_articles([*TEST_ARTICLES, _make_article("Fish Tacos", 5)])
+    index.sync()
+    assert _titles(read) == ["Fish Tacos"]
+    assert _titles(index.search("fish")) == ["Fish Tacos", "Fisherman's Pie", "Fish & Chips"]
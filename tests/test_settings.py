@@ -0,0 +1,60 @@
+import os
+import subprocess
+import sys
+
+from pathlib import Path
+
+ROOT = Path(__file__).parent.parent
+
+def run_python(code: str, data_dir: Path, **env: str) -> subprocess.CompletedProcess:
+    environ = {k: v for k, v in os.environ.items() if k not in ("EMAIL_PASSWORD", "EMAIL_USERNAME", "RECEIVER_EMAIL")}
+    return subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=ROOT,
+        env={**environ, "LAST_CHECKED_DIR": str(data_dir), **env},
+        capture_output=True,
+        text=True,
+    )
+
+def test_import_has_no_side_effects(tmp_path: Path) -> None:
+    """Test that settings import without the email variables and without creating the data directory."""
+    data_dir = tmp_path / "data"
+    result = run_python("import cozymeal.settings", data_dir)
+
+    assert result.returncode == 0, result.stderr
+    assert not data_dir.exists()
+
+def test_init_requires_email_variables(tmp_path: Path) -> None:
+    """Test that init() refuses to start without the email variables."""
+    result = run_python("from cozymeal import settings; settings.init()", tmp_path / "data")
+
+    assert result.returncode != 0
+    assert "EMAIL_PASSWORD" in result.stderr
+
+def test_init_creates_data_directory(tmp_path: Path) -> None:
+    """Test that init() creates the data directory once the configuration is complete."""
+    data_dir = tmp_path / "data"
+    result = run_python(
+        "from cozymeal import settings; settings.init()",
+        data_dir,
+        EMAIL_PASSWORD="password",
+        EMAIL_USERNAME="sender@example.com",
+        RECEIVER_EMAIL="receiver@example.com",
+    )
+
+    assert result.returncode == 0, result.stderr
+    assert data_dir.is_dir()
+
+def test_app_import_defers_crawl_and_email_stacks(tmp_path: Path) -> None:
+    """Test that importing the app loads neither the scraper, the HTTP client nor the SMTP stack."""
+    deferred = ("bs4", "requests", "urllib3", "smtplib", "email.mime.multipart")
+    result = run_python(
+        f"import sys, app; print([m for m in {deferred!r} if m in sys.modules])",
+        tmp_path,
+        EMAIL_PASSWORD="password",
+        EMAIL_USERNAME="sender@example.com",
+        RECEIVER_EMAIL="receiver@example.com",
+    )
+
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip() == "[]"
@@ -0,0 +1,53 @@
+import json
+import pytest
+import threading
+
+from cozymeal import settings, state
+from pytest import MonkeyPatch
+
+def test_get_missing_key() -> None:
+    """Test that a key that was never written reads as the default."""
+    assert state.get("missing") is None
+    assert state.get("missing", {}) == {}
+
+def test_put_and_get() -> None:
+    """Test that a value survives the round trip through its record file."""
+    state.put("key", {"a": [1, 2]})
+
+    assert state.get("key") == {"a": [1, 2]}
+    assert json.loads((settings.STATE_DIR / "key.json").read_text())["version"] == state.RECORD_VERSION
+
+def test_failed_write_keeps_old_value(monkeypatch: MonkeyPatch) -> None:
+    """Test that a write dying halfway leaves the previous record intact and no temporary files."""
+    state.put("key", "old")
+
+    def broken_dump(value, file) -> None:
+        file.write('{"version": 1, "val')
+        raise OSError("disk full")
+
+    monkeypatch.setattr("cozymeal.state.json.dump", broken_dump)
+    with pytest.raises(OSError):
+        state.put("key", "new")
+
+    assert state.get("key") == "old"
+    assert sorted(p.name for p in settings.STATE_DIR.iterdir()) == ["key.json", "key.lock"]
+
+def test_concurrent_updates_are_not_lost() -> None:
+    """Test that read-modify-write updates from many threads all land."""
+    threads = [
+        threading.Thread(target=state.update, args=("counter", lambda count: (count or 0) + 1))
+        for _ in range(20)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert state.get("counter") == 20
+
+def test_unknown_record_version_is_ignored() -> None:
+    """Test that a record in a layout this code doesn't know reads as the default."""
+    settings.STATE_DIR.mkdir()
+    (settings.STATE_DIR / "key.json").write_text(json.dumps({"version": 99, "value": "future"}))
+
+    assert state.get("key", "default") == "default"
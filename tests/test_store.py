@@ -0,0 +1,239 @@
+from datetime import datetime as dt, timedelta as tdelta
+import json
+import sqlite3
+
+from cozymeal import settings, state, store
+from cozymeal.articles import Article
+from cozymeal.sources import Source
+from pathlib import Path
+from pytest import MonkeyPatch
+from tests.conftest import ARCHIVE_START_DATE, ArchiveServer
+from typing import Callable
+
+TEST_DATE = dt(2024, 6, 1, 12, tzinfo=settings.DEFAULT_TZ)
+
+def _make_articles(days: list[int]) -> list[Article]:
+    return [Article(f"Article {d}", f"https://example.com/{d}", TEST_DATE + tdelta(days=d)) for d in days]
+
+def test_empty_store() -> None:
+    """Test queries against a store that has never been filled."""
+    assert store.query_articles(since=TEST_DATE) == []
+
+def test_merge_articles_is_keyed_by_url() -> None:
+    """Test that merging the same articles twice doesn't duplicate them."""
+    assert store.merge_articles(_make_articles([1, 2, 3])) == 3
+    assert store.merge_articles(_make_articles([2, 3, 4])) == 1
+
+    assert len(store.query_articles(since=TEST_DATE)) == 4
+
+def test_merge_articles_updates_changed_titles() -> None:
+    """Test that an article whose title changed is overwritten."""
+    store.merge_articles(_make_articles([1]))
+    store.merge_articles([Article("Renamed", "https://example.com/1", TEST_DATE + tdelta(days=1))])
+
+    [article] = store.query_articles(since=TEST_DATE)
+    assert article.title == "Renamed"
+
+def test_merge_articles_detects_modifications() -> None:
+    """Test that only a changed fingerprint, such as a new dateModified, rewrites an article."""
+    [article] = _make_articles([1])
+    store.merge_articles([article])
+    assert store.merge_articles(_make_articles([1])) == 0
+
+    article.date_modified = TEST_DATE + tdelta(days=3)
+    assert store.merge_articles([article]) == 1
+
+    [stored] = store.query_articles(since=TEST_DATE)
+    assert stored.date_modified == TEST_DATE + tdelta(days=3)
+
+def test_get_new_articles_includes_updated_articles() -> None:
+    """Test that articles modified after the cursor come back marked as updated."""
+    articles_list = _make_articles([1, 2, 5])
+    articles_list[0].date_modified = TEST_DATE + tdelta(days=4)
+    articles_list[1].date_modified = TEST_DATE + tdelta(days=2)
+    for article in articles_list:
+        article.source = "first"
+    store.merge_articles(articles_list)
+
+    new_articles = store.get_new_articles({"first": TEST_DATE + tdelta(days=3)})
+
+    assert [(a.title, a.updated) for a in new_articles] == [("Article 5", False), ("Article 1", True)]
+
+def test_query_articles_pages_through_ties() -> None:
+    """Test that keyset pages neither skip nor repeat articles published at the same time."""
+    store.merge_articles([Article(f"Article {i}", f"https://example.com/{i}", TEST_DATE) for i in range(5)])
+
+    seen = []
+    after = None
+    while page := store.query_articles(limit=2, after=after):
+        seen.extend(a.url for a in page)
+        after = (page[-1].date_published.timestamp(), page[-1].url)
+
+    assert seen == [f"https://example.com/{i}" for i in reversed(range(5))]
+
+def test_version_moves_only_on_changes() -> None:
+    """Test that the store version and change time only move when articles change."""
+    assert store.get_version() == 0
+    assert store.get_changed_at() is None
+
+    store.merge_articles(_make_articles([1, 2]))
+    store.merge_articles(_make_articles([1, 2]))
+    assert store.get_version() == 1
+
+    store.merge_articles(_make_articles([3]))
+    assert store.get_version() == 2
+    assert store.get_changed_at() is not None
+
+def test_get_changed_articles() -> None:
+    """Test that readers get exactly the articles merged after the version they last saw."""
+    store.merge_articles(_make_articles([1, 2]))
+    articles_list, version = store.get_changed_articles(-1)
+    assert [a.title for a in articles_list] == ["Article 1", "Article 2"]
+    assert version == 1
+
+    store.merge_articles(_make_articles([2, 3]))
+    store.merge_articles([Article("Renamed", "https://example.com/1", TEST_DATE + tdelta(days=1))])
+    articles_list, version = store.get_changed_articles(version)
+    assert sorted(a.title for a in articles_list) == ["Article 3", "Renamed"]
+    assert version == 3
+
+    assert store.get_changed_articles(version) == ([], version)
+
+def test_query_articles_range() -> None:
+    """Test date range queries, newest first."""
+    store.merge_articles(_make_articles([5, 1, 3, 2, 4]))
+
+    articles_list = store.query_articles(TEST_DATE + tdelta(days=2), until=TEST_DATE + tdelta(days=5))
+
+    assert [a.title for a in articles_list] == ["Article 4", "Article 3", "Article 2"]
+    assert articles_list[0].date_published == TEST_DATE + tdelta(days=4)
+
+def test_refresh_articles_is_incremental(archive_server: Callable[..., ArchiveServer], monkeypatch: MonkeyPatch) -> None:
+    """Test that a refresh only crawls back as far as the last complete crawl."""
+    server = archive_server(pages=5)
+
+    assert store.refresh_articles() == 10
+    assert store.get_crawled_through("sarah-salisbury") == ARCHIVE_START_DATE
+
+    server.requested_pages.clear()
+    monkeypatch.setattr("cozymeal.settings.CRAWL_WORKERS", 1)
+    assert store.refresh_articles() == 0
+
+    # The first page already reaches the newest stored article.
+    assert server.requested_pages == [1]
+
+def test_refresh_articles_after_failed_crawl(archive_server: Callable[..., ArchiveServer], monkeypatch: MonkeyPatch) -> None:
+    """Test that a crawl which fails partway is picked up again by the next refresh."""
+    monkeypatch.setattr("cozymeal.settings.CRAWL_WORKERS", 1)
+    monkeypatch.setattr("cozymeal.store.MERGE_BATCH_SIZE", 4)
+    server = archive_server(pages=10, failures={7: 3})
+
+    # Page 7 outlasts the fetch retries, after the first pages were merged.
+    store.refresh_articles()
+    assert 0 < len(store.query_articles(source="sarah-salisbury")) < 20
+    assert store.get_crawled_through("sarah-salisbury") is None
+    assert store.get_refreshed_at() is None
+
+    # The newest article is already stored, but the archive below it isn't.
+    assert store.refresh_articles() > 0
+    assert len(store.query_articles(source="sarah-salisbury", limit=100)) == 20
+    assert store.get_crawled_through("sarah-salisbury") == ARCHIVE_START_DATE
+
+    server.requested_pages.clear()
+    assert store.refresh_articles() == 0
+    assert server.requested_pages == [1]
+
+def test_refresh_articles_walks_whole_archive_periodically(archive_server: Callable[..., ArchiveServer], monkeypatch: MonkeyPatch) -> None:
+    """Test that once per FULL_CRAWL_INTERVAL a refresh revisits every page, conditionally."""
+    monkeypatch.setattr("cozymeal.settings.CRAWL_WORKERS", 1)
+    server = archive_server(pages=5, etags=True)
+    assert store.refresh_articles() == 10
+
+    server.requested_pages.clear()
+    store.refresh_articles()
+    assert server.requested_pages == [1]
+
+    monkeypatch.setattr("cozymeal.settings.FULL_CRAWL_INTERVAL", 0)
+    server.requested_pages.clear()
+    assert store.refresh_articles() == 0
+    assert server.requested_pages == [1, 2, 3, 4, 5, 6]
+    assert state.get(store.CRAWL_STATS_KEY)["sarah-salisbury"]["pages_skipped"] == 5
+
+def test_refresh_articles_survives_a_failing_source(archive_server: Callable[..., ArchiveServer], data_dir: Path, monkeypatch: MonkeyPatch) -> None:
+    """Test that one broken archive neither stops the others nor keeps the store from counting as refreshed."""
+    monkeypatch.setattr("cozymeal.settings.CRAWL_WORKERS", 1)
+    healthy = archive_server(pages=2, slug="healthy-author")
+    broken = archive_server(pages=2, slug="broken-author", failures={1: 100})
+    _write_sources(data_dir, [healthy, broken])
+
+    assert store.refresh_articles() == 4
+    assert store.get_refreshed_at() is not None
+    assert list(store.get_source_refreshed_at()) == ["healthy-author"]
+    assert list(state.get(store.CRAWL_STATS_KEY)) == ["healthy-author"]
+
+def _write_sources(data_dir: Path, servers: list[ArchiveServer]) -> None:
+    sources = [Source(server.slug, server.url, "Sarah").to_dict() for server in servers]
+    (data_dir / "sources.json").write_text(json.dumps(sources))
+
+def test_refresh_articles_multiple_sources(archive_server: Callable[..., ArchiveServer], data_dir: Path, monkeypatch: MonkeyPatch) -> None:
+    """Test that every configured source is crawled and stored under its own name."""
+    monkeypatch.setattr("cozymeal.settings.CRAWL_WORKERS", 1)
+    first = archive_server(pages=3, slug="first-author")
+    second = archive_server(pages=2, slug="second-author")
+    _write_sources(data_dir, [first, second])
+
+    assert store.refresh_articles() == 10
+    assert len(store.query_articles(source="first-author")) == 6
+    assert len(store.query_articles(source="second-author")) == 4
+
+    # Adding a source costs a full crawl of that source only.
+    third = archive_server(pages=4, slug="third-author")
+    _write_sources(data_dir, [first, second, third])
+    first.requested_pages.clear()
+    second.requested_pages.clear()
+
+    assert store.refresh_articles() == 8
+    assert first.requested_pages == [1]
+    assert second.requested_pages == [1]
+    assert third.requested_pages == [1, 2, 3, 4, 5]
+
+def test_get_new_articles_per_source_cursors() -> None:
+    """Test that each source is filtered by its own cutoff and results are merged by date."""
+    first = _make_articles([1, 3, 5])
+    second = [Article(f"Other {d}", f"https://example.com/other/{d}", TEST_DATE + tdelta(days=d), "other") for d in (2, 4)]
+    for article in first:
+        article.source = "first"
+    store.merge_articles(first + second)
+
+    articles_list = store.get_new_articles({
+        "first": TEST_DATE + tdelta(days=3),
+        "other": TEST_DATE,
+    })
+
+    assert [a.title for a in articles_list] == ["Article 5", "Other 4", "Article 3", "Other 2"]
+    assert store.get_new_articles({}) == []
+
+def test_store_migrates_old_schema(data_dir: Path) -> None:
+    """Test that a store written before sources existed is upgraded in place."""
+    connection = sqlite3.connect(settings.STORE_FILENAME)
+    connection.execute("""
+        CREATE TABLE articles (
+            url TEXT PRIMARY KEY,
+            title TEXT NOT NULL,
+            date_published TEXT NOT NULL,
+            published_ts REAL NOT NULL
+        )
+    """)
+    connection.execute(
+        "INSERT INTO articles VALUES (?, ?, ?, ?)",
+        ("https://example.com/old", "Old", TEST_DATE.isoformat(), TEST_DATE.timestamp()),
+    )
+    connection.commit()
+    connection.close()
+
+    [article] = store.query_articles(since=TEST_DATE)
+
+    assert article.title == "Old"
+    assert article.source == "sarah-salisbury"
+    assert article.date_modified is None
+    assert store.get_changed_articles(-1)[0] == [article]
@@ -0,0 +1,44 @@
+import json
+
+from cozymeal import settings, utils
+from cozymeal.sources import DEFAULT_SOURCE
+from datetime import datetime as dt, timedelta as tdelta
+
+TEST_TIME = dt(2024, 6, 1, 12, tzinfo=settings.DEFAULT_TZ)
+
+def test_get_last_checked_missing_file() -> None:
+    """Test that a source that was never checked has no cursor."""
+    assert utils.get_last_checked("unknown") is None
+
+def test_set_last_checked_per_source() -> None:
+    """Test that cursors are stored and updated separately for each source."""
+    utils.set_last_checked(TEST_TIME, ["first", "second"])
+    utils.set_last_checked(TEST_TIME + tdelta(days=1), ["second"])
+
+    assert utils.get_last_checked("first") == TEST_TIME
+    assert utils.get_last_checked("second") == TEST_TIME + tdelta(days=1)
+
+def test_get_last_checked_legacy_file() -> None:
+    """Test that the default source falls back to the old single-cursor file."""
+    with open(settings.LAST_CHECKED_FILENAME, 'w') as file:
+        json.dump({settings.LAST_CHECKED_KEY: TEST_TIME.isoformat()}, file)
+
+    assert utils.get_last_checked(DEFAULT_SOURCE.name) == TEST_TIME
+    assert utils.get_last_checked("other") is None
+
+def test_get_last_checked_corrupted_json() -> None:
+    """Test that a corrupted cursor file is treated as never checked."""
+    settings.LAST_CHECKED_SOURCES_FILENAME.write_text('{"first": ')
+
+    assert utils.get_last_checked("first") is None
+
+def test_get_last_checked_pre_state_file() -> None:
+    """Test that cursors from before the state store are read, and carried over on the next write."""
+    settings.LAST_CHECKED_SOURCES_FILENAME.write_text(json.dumps({"first": TEST_TIME.isoformat()}))
+
+    assert utils.get_last_checked("first") == TEST_TIME
+
+    utils.set_last_checked(TEST_TIME + tdelta(days=1), ["second"])
+
+    assert utils.get_last_checked("first") == TEST_TIME
+    assert utils.get_last_checked("second") == TEST_TIME + tdelta(days=1)
@@ -0,0 +1,102 @@
+import pytest
+import threading
+import time
+
+from cozymeal import store, worker
+from pytest import MonkeyPatch
+
+@pytest.fixture
+def crawls(monkeypatch: MonkeyPatch) -> list[str]:
+    """Replace the crawl with a stand-in that records which worker ran it."""
+
+    calls = []
+
+    def mock_refresh_articles() -> int:
+        calls.append(threading.current_thread().name)
+        store.set_meta(store.REFRESHED_AT_KEY, str(time.time()))
+        return 0
+
+    monkeypatch.setattr("cozymeal.store.refresh_articles", mock_refresh_articles)
+    monkeypatch.setattr("cozymeal.settings.CRAWL_INTERVAL", 0.05)
+    monkeypatch.setattr("cozymeal.settings.CRAWL_JITTER", 0)
+    return calls
+
+@pytest.fixture
+def refreshes(monkeypatch: MonkeyPatch) -> list[float]:
+    """Replace the crawl with a slow stand-in that records when it ran."""
+
+    calls = []
+
+    def mock_refresh_articles() -> int:
+        calls.append(time.time())
+        time.sleep(0.2)
+        store.set_meta(store.REFRESHED_AT_KEY, str(time.time()))
+        return 0
+
+    monkeypatch.setattr("cozymeal.store.refresh_articles", mock_refresh_articles)
+    return calls
+
+def _set_age(seconds: float) -> None:
+    store.set_meta(store.REFRESHED_AT_KEY, str(time.time() - seconds))
+
+def _start(name: str) -> threading.Event:
+    stop = threading.Event()
+    threading.Thread(target=worker.run, args=(stop,), name=name, daemon=True).start()
+    return stop
+
+def test_only_the_leader_crawls(crawls: list[str]) -> None:
+    """Test that of several workers only the one holding the lock crawls, and the rest take over when it stops."""
+    stops = {name: _start(name) for name in ("a", "b", "c")}
+    time.sleep(0.3)
+
+    assert len(crawls) >= 2
+    [leader] = set(crawls)
+
+    stops.pop(leader).set()
+    time.sleep(0.3)
+    for stop in stops.values():
+        stop.set()
+
+    assert len(set(crawls)) == 2
+    assert crawls[-1] != leader
+
+def test_crawl_if_due_skips_fresh_store(crawls: list[str], monkeypatch: MonkeyPatch) -> None:
+    """Test that a worker restarted right after a crawl doesn't crawl again."""
+    monkeypatch.setattr("cozymeal.settings.CRAWL_INTERVAL", 60)
+
+    assert worker.crawl_if_due()
+    assert not worker.crawl_if_due()
+    assert len(crawls) == 1
+
+def test_crawl_failure_keeps_worker_running(monkeypatch: MonkeyPatch) -> None:
+    """Test that a failed crawl is logged rather than ending the worker."""
+    def mock_refresh_articles() -> int:
+        raise ConnectionError("archive unreachable")
+
+    monkeypatch.setattr("cozymeal.store.refresh_articles", mock_refresh_articles)
+
+    assert worker.crawl_if_due() is False
+
+def test_concurrent_refreshes_crawl_once(refreshes: list[float]) -> None:
+    """Test that simultaneous refreshes of a cold store share a single crawl."""
+    threads = [threading.Thread(target=worker.refresh, kwargs={"max_age": 60}) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(refreshes) == 1
+
+def test_refresh_always_crawls(refreshes: list[float]) -> None:
+    """Test that a refresh without a max age crawls however recent the last crawl was."""
+    _set_age(1)
+
+    assert worker.refresh() is True
+    assert len(refreshes) == 1
+
+def test_refresh_within_max_age(refreshes: list[float]) -> None:
+    """Test that a refresh skips the crawl while the last one is younger than max_age."""
+    _set_age(10)
+
+    assert worker.refresh(max_age=60) is False
+    assert refreshes == []